@@ -1,5 +1,6 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
 import os
 from dotenv import load_dotenv
 import requests
@@ -10,6 +11,8 @@ from knowledge_graph import KnowledgeGraph
 from document_processor import DocumentProcessor
 from ai_safety import DeepSafeValidator
 from scholarly_search import ScholarlySearch
+from upload_stream import UploadTooLargeError
+from ingest_profiler import IngestProfile
 
 # Load environment variables
 load_dotenv()
@@ -18,6 +21,9 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
+# Reject oversized request bodies before they are read
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', '16777216').split('#')[0].strip())
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -65,6 +71,18 @@ def chat():
         # Step 2: Knowledge Graph search
         kg_results = kg.search_knowledge(user_query)
         
+        # Step 2b: Connections between the top matching entities (if requested)
+        connection_results = []
+        if data.get('include_connections', False):
+            entity_names = []
+            for result in kg_results:
+                if result['entity'] and result['entity'] not in entity_names:
+                    entity_names.append(result['entity'])
+            if len(entity_names) >= 2:
+                connections = kg.find_connections(entity_names[0], entity_names[1])
+                if connections['found']:
+                    connection_results.append(connections)
+        
         # Step 3: Document search
         doc_results = doc_processor.search_documents(user_query)
         
@@ -78,7 +96,8 @@ def chat():
             user_query, 
             kg_results, 
             doc_results, 
-            scholarly_results
+            scholarly_results,
+            connection_results
         )
         
         return jsonify({
@@ -86,7 +105,8 @@ def chat():
             'sources': {
                 'knowledge_graph': kg_results,
                 'documents': doc_results,
-                'scholarly': scholarly_results
+                'scholarly': scholarly_results,
+                'connections': connection_results
             },
             'timestamp': datetime.now().isoformat()
         })
@@ -105,9 +125,62 @@ def get_knowledge_graph():
         logger.error(f"Knowledge graph endpoint error: {str(e)}")
         return jsonify({'error': 'Failed to retrieve graph data'}), 500
 
+@app.route('/api/knowledge-graph/changes', methods=['GET'])
+def get_knowledge_graph_changes():
+    """Get knowledge graph changes since a version for delta sync"""
+    try:
+        since = request.args.get('since', type=int)
+        if since is None:
+            return jsonify({'error': 'since version is required'}), 400
+        
+        return jsonify(kg.get_changes(since))
+        
+    except Exception as e:
+        logger.error(f"Knowledge graph changes error: {str(e)}")
+        return jsonify({'error': 'Failed to retrieve graph changes'}), 500
+
+@app.route('/api/knowledge-graph/paths', methods=['POST'])
+def get_knowledge_graph_paths():
+    """Find how two entities are connected in the knowledge graph"""
+    try:
+        data = request.get_json()
+        source = data.get('source', '').strip()
+        target = data.get('target', '').strip()
+        
+        if not source or not target:
+            return jsonify({'error': 'Source and target are required'}), 400
+        
+        k = min(int(data.get('k', 3)), 20)
+        max_depth = min(int(data.get('max_depth', 4)), 8)
+        
+        return jsonify(kg.find_connections(source, target, k=k, max_depth=max_depth))
+        
+    except Exception as e:
+        logger.error(f"Knowledge graph paths error: {str(e)}")
+        return jsonify({'error': 'Failed to find connections'}), 500
+
+@app.route('/api/suggest', methods=['GET'])
+def suggest():
+    """Autocomplete entity names for the chat box"""
+    try:
+        prefix = request.args.get('q', '').strip()
+        limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+        
+        if not prefix:
+            return jsonify({'suggestions': []})
+        
+        return jsonify({
+            'query': prefix,
+            'suggestions': kg.suggest_entities(prefix, limit=limit)
+        })
+        
+    except Exception as e:
+        logger.error(f"Suggest endpoint error: {str(e)}")
+        return jsonify({'error': 'Failed to get suggestions'}), 500
+
 @app.route('/api/upload-document', methods=['POST'])
 def upload_document():
-    """Upload and process new documents"""
+    """Upload and process new documents (profile=true adds a per-stage timing report)"""
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'No file uploaded'}), 400
@@ -116,22 +189,48 @@ def upload_document():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Process the document
-        result = doc_processor.process_uploaded_file(file)
+        include_profile = request.values.get('profile', '').lower() in ('1', 'true', 'yes')
         
-        # Update knowledge graph
-        kg.update_from_document(result)
+        with IngestProfile(track_memory=include_profile or None) as profile:
+            # Process the document
+            try:
+                result = doc_processor.process_uploaded_file(file, profile, path=request.values.get('path'))
+            except UploadTooLargeError as e:
+                return jsonify({'error': str(e)}), 413
+            document_info = result['document_info']
+            
+            # Update knowledge graph (a duplicate upload is already in it), and only record
+            # the upload once it is, so a failed upload is processed again when retried
+            if not document_info.get('duplicate'):
+                if not kg.update_from_document(result, profile):
+                    return jsonify({'error': 'Failed to update knowledge graph'}), 500
+                doc_processor.record_upload(result, profile)
         
-        return jsonify({
+        doc_processor.ingest_metrics.add(profile)
+        
+        response = {
             'message': 'Document processed successfully',
-            'entities_extracted': result['entities_count'],
-            'relations_extracted': result['relations_count']
-        })
+            'entities_extracted': document_info['entities_count'],
+            'relations_extracted': document_info['relations_count'],
+            'duplicate': document_info.get('duplicate', False),
+            'reused_chunks': document_info.get('reused_chunks', 0)
+        }
+        if include_profile:
+            response['profile'] = profile.to_dict()
+        return jsonify(response)
         
+    except HTTPException:
+        # Request errors such as a body over MAX_CONTENT_LENGTH go to their own handlers
+        raise
     except Exception as e:
         logger.error(f"Document upload error: {str(e)}")
         return jsonify({'error': 'Failed to process document'}), 500
 
+@app.errorhandler(413)
+def request_too_large(e):
+    """Return a JSON error for request bodies over MAX_CONTENT_LENGTH"""
+    return jsonify({'error': f"Upload exceeds the {app.config['MAX_CONTENT_LENGTH']} byte limit"}), 413
+
 @app.route('/api/search-papers', methods=['POST'])
 def search_papers():
     """Search for academic papers"""
@@ -140,7 +239,11 @@ def search_papers():
         query = data.get('query', '')
         limit = data.get('limit', 10)
         
-        papers = scholarly_search.search_papers(query, limit)
+        # local=true searches only the papers cached from earlier searches
+        if data.get('local', False):
+            papers = scholarly_search.search_local(query, limit)
+        else:
+            papers = scholarly_search.search_papers(query, limit)
         
         return jsonify({
             'papers': papers,
@@ -154,11 +257,16 @@ def search_papers():
 
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
-    """Get system statistics"""
+    """Get system statistics, with processed documents paginated by ?limit=&before=&file_type="""
     try:
+        limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+        before = request.args.get('before', type=int)
+        file_type = request.args.get('file_type')
+        
         stats = {
             'knowledge_graph': kg.get_stats(),
-            'documents': doc_processor.get_stats(),
+            'documents': doc_processor.get_stats(limit=limit, before=before, file_type=file_type),
+            'paper_cache': scholarly_search.cache.get_stats(),
             'system': {
                 'uptime': datetime.now().isoformat(),
                 'version': '1.0.0'
@@ -169,6 +277,24 @@ def get_stats():
         logger.error(f"Stats endpoint error: {str(e)}")
         return jsonify({'error': 'Failed to retrieve stats'}), 500
 
+@app.route('/api/admin/slow-queries', methods=['GET'])
+def get_slow_queries():
+    """Get Cypher query latency statistics and slow query plans"""
+    try:
+        return jsonify(kg.get_query_report())
+    except Exception as e:
+        logger.error(f"Slow query endpoint error: {str(e)}")
+        return jsonify({'error': 'Failed to retrieve slow queries'}), 500
+
+@app.route('/api/admin/ingest-metrics', methods=['GET'])
+def get_ingest_metrics():
+    """Get per-stage ingestion time, CPU, memory and item counts aggregated over uploads"""
+    try:
+        return jsonify(doc_processor.ingest_metrics.get_report())
+    except Exception as e:
+        logger.error(f"Ingest metrics endpoint error: {str(e)}")
+        return jsonify({'error': 'Failed to retrieve ingest metrics'}), 500
+
 @app.route('/ask', methods=['POST'])
 def ask():
     """Handle AI-based queries"""
@@ -187,11 +313,11 @@ def ask():
         logger.error(f"Ask endpoint error: {str(e)}")
         return jsonify({'error': 'Failed to process request'}), 500
 
-def generate_ai_response(query, kg_results, doc_results, scholarly_results):
+def generate_ai_response(query, kg_results, doc_results, scholarly_results, connection_results=None):
     """Generate AI response using OpenRouter"""
     try:
         # Prepare context from all sources
-        context = prepare_context(kg_results, doc_results, scholarly_results)
+        context = prepare_context(kg_results, doc_results, scholarly_results, connection_results)
         
         # Create prompt
         prompt = f"""
@@ -246,7 +372,7 @@ def generate_ai_response(query, kg_results, doc_results, scholarly_results):
         logger.error(f"AI response generation error: {str(e)}")
         return "I apologize, but I encountered an error while processing your request."
 
-def prepare_context(kg_results, doc_results, scholarly_results):
+def prepare_context(kg_results, doc_results, scholarly_results, connection_results=None):
     """Prepare context from all sources"""
     context = {
         'kg_context': '',
@@ -261,6 +387,16 @@ def prepare_context(kg_results, doc_results, scholarly_results):
             for result in kg_results[:5]
         ])
     
+    # Entity connection paths
+    if connection_results:
+        path_lines = []
+        for connection in connection_results:
+            for path in connection['paths']:
+                steps = [f"{rel['source']} -[{rel['type']}]-> {rel['target']}" for rel in path['relationships']]
+                path_lines.append(f"- {'; '.join(steps)}")
+        if path_lines:
+            context['kg_context'] = '\n'.join(filter(None, [context['kg_context'], 'Connections:'] + path_lines))
+    
     # Document context
     if doc_results:
         context['doc_context'] = '\n'.join([
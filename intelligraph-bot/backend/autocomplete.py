@@ -0,0 +1,261 @@
+import os
+import re
+import time
+import bisect
+import heapq
+import logging
+import threading
+from typing import List, Dict, Any, Iterable
+
+logger = logging.getLogger(__name__)
+
+def normalize_name(text: str) -> str:
+    """Normalize a name or prefix for matching"""
+    return re.sub(r'\s+', ' ', text.lower()).strip()
+
+
+class SuggestionIndex:
+    """In-memory prefix index over entity names and aliases for autocomplete"""
+
+    def __init__(self, cache_prefix_length: int = 3, cache_size: int = 50,
+                 max_scan: int = None, ttl: int = None, delta_size: int = 512):
+        self.cache_prefix_length = cache_prefix_length
+        # Cached prefixes answer limits up to cache_size; larger limits scan the keys
+        self.cache_size = cache_size
+        self.delta_size = delta_size
+        self.max_scan = int(max_scan if max_scan is not None else os.getenv('SUGGEST_MAX_SCAN', 2000))
+        self.ttl = int(ttl if ttl is not None else os.getenv('SUGGEST_INDEX_TTL', 3600))
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        """Drop all indexed names"""
+        with self.lock:
+            self.names = []          # name id -> display name
+            self.counts = []         # name id -> times recorded
+            self.name_ids = {}       # normalized name -> name id
+            self.name_keys = []      # name id -> keys indexed for it
+            self.keys = []           # sorted normalized keys (names, aliases, word starts)
+            self.key_ids = []        # name id for each key, parallel to self.keys
+            self.key_primary = []    # whether the key is a whole name or alias
+            self.delta = []          # sorted (key, name id, primary) added since the last merge
+            self.top_by_prefix = {}  # short prefix -> name ids ranked by count
+            self.pending = None      # keys collected during a bulk build
+            self.built_at = None
+
+    def is_stale(self) -> bool:
+        """Check whether the index needs to be (re)built"""
+        return self.built_at is None or time.time() - self.built_at > self.ttl
+
+    def build(self, entries: Iterable[Dict[str, Any]]):
+        """Rebuild the index from {'name', 'aliases', 'count'} entries"""
+        # Build off to the side so lookups keep working while entries stream in
+        fresh = SuggestionIndex(self.cache_prefix_length, self.cache_size, self.max_scan, self.ttl, self.delta_size)
+        fresh.pending = []
+        for entry in entries:
+            fresh.add(entry['name'], entry.get('aliases') or [], entry.get('count', 1))
+
+        # Sort all keys once instead of inserting them one by one
+        fresh.pending.sort()
+        fresh.keys = [key for key, _, _ in fresh.pending]
+        fresh.key_ids = [name_id for _, name_id, _ in fresh.pending]
+        fresh.key_primary = [not secondary for _, _, secondary in fresh.pending]
+        fresh.pending = None
+
+        by_prefix = {}
+        for name_id, keys in enumerate(fresh.name_keys):
+            for prefix in fresh.short_prefixes(keys):
+                by_prefix.setdefault(prefix, []).append(name_id)
+        for prefix, name_ids in by_prefix.items():
+            fresh.top_by_prefix[prefix] = heapq.nsmallest(fresh.cache_size, name_ids, key=fresh.rank_key)
+
+        with self.lock:
+            for attribute in ('names', 'counts', 'name_ids', 'name_keys', 'keys',
+                              'key_ids', 'key_primary', 'delta', 'top_by_prefix'):
+                setattr(self, attribute, getattr(fresh, attribute))
+            self.built_at = time.time()
+        logger.info(f"Suggestion index built: {len(self.names)} names, {len(self.keys)} keys")
+
+    def add(self, name: str, aliases: Iterable[str] = (), count: int = 1):
+        """Record a name (and its aliases), bumping its count if already indexed"""
+        normalized = normalize_name(name or '')
+        if not normalized:
+            return
+
+        with self.lock:
+            name_id = self.name_ids.get(normalized)
+            if name_id is None:
+                name_id = len(self.names)
+                self.name_ids[normalized] = name_id
+                self.names.append(name)
+                self.counts.append(0)
+                self.name_keys.append([])
+            self.counts[name_id] += count
+
+            for text in [name, *aliases]:
+                key = normalize_name(text or '')
+                if not key:
+                    continue
+                self.insert_key(key, name_id, True)
+
+                # Also index the start of each later word so "learn" finds "Machine Learning"
+                for match in re.finditer(r' (?=\S{2})', key):
+                    self.insert_key(key[match.end():], name_id, False)
+
+            if self.pending is None:
+                self.update_prefix_cache(name_id)
+
+    def insert_key(self, key: str, name_id: int, primary: bool):
+        """Add a key to the small sorted delta list (or the pending list during a build)"""
+        if key in self.name_keys[name_id]:
+            return
+        self.name_keys[name_id].append(key)
+
+        if self.pending is not None:
+            self.pending.append((key, name_id, not primary))
+            return
+
+        # Inserting into the main lists would shift every later key; the delta stays
+        # small and is merged in one linear pass once it fills up
+        bisect.insort(self.delta, (key, name_id, primary))
+        if len(self.delta) >= self.delta_size:
+            self.merge_delta()
+
+    def merge_delta(self):
+        """Merge the delta list into the main sorted key lists"""
+        merged = list(heapq.merge(zip(self.keys, self.key_ids, self.key_primary), self.delta))
+        self.keys = [key for key, _, _ in merged]
+        self.key_ids = [name_id for _, name_id, _ in merged]
+        self.key_primary = [primary for _, _, primary in merged]
+        self.delta = []
+
+    def key_runs(self):
+        """Get the sorted (keys, name ids, primary flags) runs to search"""
+        runs = [(self.keys, self.key_ids, self.key_primary)]
+        if self.delta:
+            runs.append(([key for key, _, _ in self.delta], [name_id for _, name_id, _ in self.delta],
+                         [primary for _, _, primary in self.delta]))
+        return runs
+
+    def short_prefixes(self, keys: Iterable[str]) -> set:
+        """Get the cached short prefixes that lead to any of the keys"""
+        return {key[:length] for key in keys
+                for length in range(1, min(len(key), self.cache_prefix_length) + 1)}
+
+    def rank_key(self, name_id: int) -> tuple:
+        """Sort key ranking more frequent, then shorter, names first"""
+        return (-self.counts[name_id], len(self.names[name_id]))
+
+    def update_prefix_cache(self, name_id: int):
+        """Re-rank the cached short prefixes that lead to a name"""
+        for prefix in self.short_prefixes(self.name_keys[name_id]):
+            ranked = self.top_by_prefix.setdefault(prefix, [])
+            if name_id not in ranked:
+                ranked.append(name_id)
+            ranked.sort(key=self.rank_key)
+            del ranked[self.cache_size:]
+
+    def prefix_range(self, prefix: str, keys: List[str] = None):
+        """Get the [start, end) range of keys beginning with a prefix"""
+        keys = self.keys if keys is None else keys
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + '\uffff', lo=start)
+        return start, end
+
+    def has_prefix(self, prefix: str) -> bool:
+        """Check whether any key begins with a prefix"""
+        return any(start < end for start, end in
+                   (self.prefix_range(prefix, keys) for keys, _, _ in self.key_runs()))
+
+    def collect(self, prefix: str, candidates: Dict[int, tuple], penalty: int = 0, max_scan: int = None,
+                limit: int = None):
+        """Collect name ids for a prefix into candidates with their best match rank"""
+        if (len(prefix) <= self.cache_prefix_length and prefix in self.top_by_prefix
+                and (limit or 0) <= self.cache_size):
+            for name_id in self.top_by_prefix[prefix]:
+                primary = normalize_name(self.names[name_id]).startswith(prefix)
+                rank = (penalty, 0 if primary else 1)
+                if name_id not in candidates or rank < candidates[name_id]:
+                    candidates[name_id] = rank
+            return
+
+        for keys, key_ids, key_primary in self.key_runs():
+            start = bisect.bisect_left(keys, prefix)
+            end = min(len(keys), start + (max_scan or self.max_scan))
+            for position in range(start, end):
+                if not keys[position].startswith(prefix):
+                    break
+                name_id = key_ids[position]
+                rank = (penalty, 0 if key_primary[position] else 1)
+                if name_id not in candidates or rank < candidates[name_id]:
+                    candidates[name_id] = rank
+
+    def next_chars(self, prefix: str) -> List[str]:
+        """Get the distinct characters that follow a prefix in the key list"""
+        chars = set()
+        for keys, _, _ in self.key_runs():
+            position, end = self.prefix_range(prefix, keys)
+            while position < end:
+                key = keys[position]
+                if len(key) == len(prefix):
+                    position += 1
+                    continue
+                char = key[len(prefix)]
+                chars.add(char)
+                position = bisect.bisect_left(keys, prefix + chr(ord(char) + 1), position, end)
+        return sorted(chars)
+
+    def fuzzy_variants(self, prefix: str) -> List[str]:
+        """Generate indexed prefixes within one edit (deletion, transposition, substitution, insertion)"""
+        # An edit past the longest indexed prefix cannot produce a match, and only
+        # characters that actually follow an indexed prefix are worth substituting
+        matched = len(prefix)
+        while matched and not self.has_prefix(prefix[:matched]):
+            matched -= 1
+
+        variants = set()
+        for i in range(min(matched + 1, len(prefix))):
+            variants.add(prefix[:i] + prefix[i + 1:])
+            if i + 1 < len(prefix):
+                variants.add(prefix[:i] + prefix[i + 1] + prefix[i] + prefix[i + 2:])
+            for char in self.next_chars(prefix[:i]):
+                variants.add(prefix[:i] + char + prefix[i + 1:])
+                variants.add(prefix[:i] + char + prefix[i:])
+        variants.discard(prefix)
+        return [variant for variant in variants if len(variant.strip()) > self.cache_prefix_length]
+
+    def suggest(self, prefix: str, limit: int = 10, fuzzy: bool = True) -> List[Dict[str, Any]]:
+        """Get ranked completions for a prefix"""
+        normalized = normalize_name(prefix)
+        if not normalized:
+            return []
+
+        with self.lock:
+            candidates = {}
+            self.collect(normalized, candidates, limit=limit)
+
+            # Tolerate one typo once the prefix is long enough to be selective
+            if fuzzy and len(candidates) < limit and len(normalized) > self.cache_prefix_length:
+                for variant in self.fuzzy_variants(normalized):
+                    self.collect(variant, candidates, penalty=1, max_scan=limit)
+
+            ranked = sorted(candidates.items(), key=lambda item: (item[1], self.rank_key(item[0])))
+
+            return [
+                {
+                    'name': self.names[name_id],
+                    'count': self.counts[name_id],
+                    'fuzzy': rank[0] > 0
+                }
+                for name_id, rank in ranked[:limit]
+            ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get index size and freshness"""
+        with self.lock:
+            return {
+                'names': len(self.names),
+                'keys': len(self.keys) + len(self.delta),
+                'built_at': self.built_at,
+                'stale': self.is_stale()
+            }
@@ -0,0 +1,284 @@
+"""Bulk ingestion of a document directory into the document store and knowledge graph.
+
+Usage: python bulk_ingest.py /path/to/archive [--workers 8] [--batch-size 5000]
+
+Files are extracted and analyzed on a process pool. Progress is checkpointed in a
+SQLite file, so an interrupted run picks up where it stopped when started again.
+"""
+import os
+import sys
+import time
+import json
+import sqlite3
+import logging
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    status TEXT NOT NULL,
+    document_id INTEGER,
+    error TEXT,
+    updated_at TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Per-process extraction-only processor, created by the pool initializer
+worker_processor = None
+
+
+def init_worker():
+    """Load the NLP pipeline once per worker process"""
+    global worker_processor
+    from document_processor import DocumentProcessor
+    worker_processor = DocumentProcessor(storage=False)
+
+
+def document_name(path: str, root: str) -> str:
+    """Identify a file by its path relative to the ingest root, so same-named files stay distinct"""
+    return os.path.relpath(path, root).replace(os.sep, '/')
+
+
+def analyze_file(path: str, document: str) -> Dict[str, Any]:
+    """Extract and analyze one file (runs in worker processes)"""
+    text = worker_processor.extract_text_from_path(path)
+    result = worker_processor.process_text(
+        text, document,
+        outputs={'entities', 'relations', 'keyword_counts', 'summary'})
+    result['text'] = text
+    return result
+
+
+class Checkpoint:
+    """Per-file ingestion state so interrupted runs can resume"""
+
+    def __init__(self, path: str):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(CHECKPOINT_SCHEMA)
+
+    def get(self, path: str, size: int, mtime: float) -> Tuple[str, int]:
+        """Get the (status, document id) of a file, ignoring state recorded for an older version"""
+        row = self.conn.execute("SELECT size, mtime, status, document_id FROM files WHERE path = ?",
+                                (path,)).fetchone()
+        if row is None or row[0] != size or row[1] != mtime:
+            return None, None
+        return row[2], row[3]
+
+    def mark(self, entries: List[Tuple[str, int, float, int]], status: str, error: str = None):
+        """Record the status of several (path, size, mtime, document id) files"""
+        now = datetime.now().isoformat()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO files (path, size, mtime, status, document_id, error, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(path, size, mtime, status, document_id, error, now)
+                 for path, size, mtime, document_id in entries]
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+class BulkIngester:
+    """Walk a directory tree and ingest its documents on a process pool"""
+
+    def __init__(self, checkpoint_path: str = None, workers: int = None, batch_size: int = None,
+                 max_in_flight: int = None):
+        self.checkpoint = Checkpoint(checkpoint_path or os.getenv('INGEST_CHECKPOINT_PATH',
+                                                                  'data/ingest_checkpoint.db'))
+        self.workers = int(workers if workers is not None
+                           else os.getenv('INGEST_WORKERS', os.cpu_count() or 1))
+        self.batch_size = int(batch_size if batch_size is not None
+                              else os.getenv('INGEST_KG_BATCH_SIZE', 5000))
+        self.max_in_flight = max_in_flight or self.workers * 4
+
+        from document_processor import DocumentProcessor
+        from knowledge_graph import KnowledgeGraph
+        self.processor = DocumentProcessor()
+        self.kg = KnowledgeGraph()
+
+        self.pending_entities = {}
+        self.pending_relations = []
+        self.pending_files = []
+        self.stats = {'files': 0, 'bytes': 0, 'skipped': 0, 'failed': 0, 'entities': 0, 'relations': 0}
+        self.failures = []
+
+    def scan(self, root: str) -> Iterator[Tuple[str, int, float]]:
+        """Yield (path, size, mtime) for supported files under root, in a stable order"""
+        for directory, subdirectories, filenames in os.walk(root):
+            subdirectories.sort()
+            for filename in sorted(filenames):
+                if os.path.splitext(filename)[1].lower() not in self.processor.supported_formats:
+                    continue
+                path = os.path.join(directory, filename)
+                stat = os.stat(path)
+                yield path, stat.st_size, stat.st_mtime
+
+    def run(self, root: str, retry_failed: bool = True) -> Dict[str, Any]:
+        """Ingest every new or changed file under root and return throughput statistics"""
+        started = time.time()
+        self.root = root
+        entries = self.pending_work(root, retry_failed)
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker) as executor:
+            in_flight = {}
+            while entries or in_flight:
+                # Keep a bounded window of files submitted ahead of the consumer
+                while entries and len(in_flight) < self.max_in_flight:
+                    entry = entries.pop()
+                    in_flight[executor.submit(analyze_file, entry[0], document_name(entry[0], root))] = entry
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    entry = in_flight.pop(future)
+                    try:
+                        self.store(entry, future.result())
+                    except Exception as e:
+                        logger.error(f"Failed to ingest {entry[0]}: {e}")
+                        self.stats['failed'] += 1
+                        self.failures.append({'path': entry[0], 'error': str(e)})
+                        # A document already stored only needs its graph facts synced next time
+                        status, document_id = self.checkpoint.get(*entry)
+                        self.checkpoint.mark([(*entry, document_id)], 'stored' if status == 'stored' else 'failed',
+                                             error=str(e))
+
+                    if len(self.pending_entities) + len(self.pending_relations) >= self.batch_size:
+                        self.flush()
+                    self.report(started, every=100)
+
+        self.flush()
+        return self.report(started)
+
+    def pending_work(self, root: str, retry_failed: bool) -> List[Tuple[str, int, float]]:
+        """List the files that still need work, largest last so they start first"""
+        entries = []
+        for entry in self.scan(root):
+            status, _ = self.checkpoint.get(*entry)
+            if status == 'done' or (status == 'failed' and not retry_failed):
+                self.stats['skipped'] += 1
+                continue
+            entries.append(entry)
+        entries.sort(key=lambda entry: entry[1])
+        logger.info(f"{len(entries)} files to ingest, {self.stats['skipped']} already done")
+        return entries
+
+    def store(self, entry: Tuple[str, int, float], result: Dict[str, Any]):
+        """Store a worker result and queue its graph facts for the next batch"""
+        path, size, mtime = entry
+        text = result.pop('text')
+
+        filename = document_name(path, self.root)
+
+        # A file stored before an interruption keeps its document; only graph facts are redone
+        status, document_id = self.checkpoint.get(path, size, mtime)
+        version = None
+        if status != 'stored':
+            stored = self.processor.document_store.add_document_version(
+                filename, text, os.path.splitext(path)[1].lower())
+            document_id, version = stored['document_id'], stored['version']
+            self.processor.index_document_vectors(document_id, stored['new_chunk_ids'], stored['removed_chunk_ids'])
+            self.processor.keyword_engine.score(result.get('keyword_counts', {}), result.get('token_count', 0),
+                                                document=filename)
+            self.processor.registry.register({
+                'filename': filename,
+                'file_type': os.path.splitext(path)[1].lower(),
+                'entities_count': len(result['entities']),
+                'relations_count': len(result['relations']),
+                'word_count': len(text.split()),
+                'document_id': document_id,
+                'version': version
+            })
+            self.checkpoint.mark([(*entry, document_id)], 'stored')
+
+        if version == 1:
+            for entity in result['entities']:
+                self.pending_entities.setdefault((filename, entity['name'].lower(), entity['type']),
+                                                 {**entity, 'document': filename})
+            self.pending_relations.extend({**relation, 'document': filename} for relation in result['relations'])
+            self.pending_files.append((*entry, document_id))
+        else:
+            # A revised (or half-ingested) document may already have facts in the graph, so diff against them
+            self.kg.sync_document(filename, result['entities'], result['relations'])
+            self.checkpoint.mark([(*entry, document_id)], 'done')
+
+        self.stats['files'] += 1
+        self.stats['bytes'] += size
+        self.stats['entities'] += len(result['entities'])
+        self.stats['relations'] += len(result['relations'])
+
+    def flush(self):
+        """Push queued graph facts in one batch and mark their files done once it is committed"""
+        if not self.pending_files:
+            return
+        written = (self.kg.add_entities(list(self.pending_entities.values()))
+                   and self.kg.add_relationships(self.pending_relations))
+
+        if written:
+            self.checkpoint.mark(self.pending_files, 'done')
+            logger.info(f"Pushed {len(self.pending_entities)} entities and {len(self.pending_relations)} "
+                        f"relations from {len(self.pending_files)} files")
+        else:
+            # The files stay 'stored', so the next run syncs whatever part of the batch was written
+            error = "knowledge graph batch write failed"
+            logger.error(f"{error} for {len(self.pending_files)} files")
+            self.checkpoint.mark(self.pending_files, 'stored', error=error)
+            self.stats['failed'] += len(self.pending_files)
+            self.failures.extend({'path': entry[0], 'error': error} for entry in self.pending_files)
+        self.pending_entities = {}
+        self.pending_relations = []
+        self.pending_files = []
+
+    def report(self, started: float, every: int = None) -> Dict[str, Any]:
+        """Log and return throughput so far (only every N files when given)"""
+        if every and (self.stats['files'] + self.stats['failed']) % every:
+            return {}
+        elapsed = max(time.time() - started, 1e-9)
+        report = {
+            **self.stats,
+            'elapsed_seconds': round(elapsed, 1),
+            'files_per_second': round(self.stats['files'] / elapsed, 2),
+            'mb_per_second': round(self.stats['bytes'] / elapsed / 1e6, 2),
+            'failures': self.failures
+        }
+        logger.info(f"{self.stats['files']} files, {self.stats['failed']} failed, "
+                    f"{report['files_per_second']} files/s, {report['mb_per_second']} MB/s")
+        return report
+
+    def close(self):
+        self.checkpoint.close()
+        self.kg.close()
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Bulk-ingest a directory of documents")
+    parser.add_argument('directory', help="Directory to scan recursively")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes")
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help="Entities and relations per knowledge graph write")
+    parser.add_argument('--checkpoint', default=None, help="Checkpoint database path")
+    parser.add_argument('--skip-failed', action='store_true', help="Do not retry files that failed before")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'))
+    ingester = BulkIngester(checkpoint_path=args.checkpoint, workers=args.workers, batch_size=args.batch_size)
+    try:
+        report = ingester.run(args.directory, retry_failed=not args.skip_failed)
+    finally:
+        ingester.close()
+
+    print(json.dumps(report, indent=2))
+    return 1 if report['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
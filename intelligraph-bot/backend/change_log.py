@@ -0,0 +1,88 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeLog:
+    """Bounded, versioned log of knowledge graph writes for delta sync"""
+
+    def __init__(self, size: int = None):
+        self.size = int(size if size is not None else os.getenv('CHANGE_LOG_SIZE', 10000))
+        self.entries = deque(maxlen=self.size)
+        # Seed from the clock so versions keep increasing across restarts and clients
+        # holding a version from a previous process are told to reload
+        self.version = int(time.time() * 1000)
+        self.oldest_version = self.version
+        self.lock = threading.Lock()
+
+    def record(self, kind: str, operation: str, item_id: Any, data: Optional[Dict[str, Any]] = None) -> int:
+        """Record a node or edge change and return its version"""
+        with self.lock:
+            self.version += 1
+            if len(self.entries) == self.size:
+                # The oldest entry is about to be evicted
+                self.oldest_version = self.entries[0]['version']
+            self.entries.append({
+                'version': self.version,
+                'kind': kind,
+                'operation': operation,
+                'id': item_id,
+                'data': data
+            })
+            return self.version
+
+    def current_version(self) -> int:
+        """Get the version of the latest recorded change"""
+        with self.lock:
+            return self.version
+
+    def changes_since(self, since: int) -> Dict[str, Any]:
+        """Get the net node and edge changes after a version"""
+        with self.lock:
+            version = self.version
+            if since < self.oldest_version or since > version:
+                # Changes were truncated from the log (or the version is from elsewhere)
+                return {
+                    'since': since,
+                    'version': version,
+                    'full_reload': True
+                }
+
+            # Collapse multiple changes to the same item into its net effect
+            net = {'node': {}, 'edge': {}}
+            for entry in self.entries:
+                if entry['version'] <= since:
+                    continue
+                items = net[entry['kind']]
+                previous = items.get(entry['id'])
+
+                if entry['operation'] == 'removed':
+                    if previous and previous['operation'] == 'added':
+                        del items[entry['id']]
+                    else:
+                        items[entry['id']] = entry
+                elif entry['operation'] == 'updated' and previous and previous['operation'] == 'added':
+                    items[entry['id']] = {**entry, 'operation': 'added'}
+                else:
+                    items[entry['id']] = entry
+
+        result = {
+            'since': since,
+            'version': version,
+            'full_reload': False
+        }
+        for kind, key in (('node', 'nodes'), ('edge', 'edges')):
+            changes = {'added': [], 'updated': [], 'removed': []}
+            for item_id, entry in net[kind].items():
+                if entry['operation'] == 'removed':
+                    changes['removed'].append(item_id)
+                else:
+                    changes[entry['operation']].append(entry['data'])
+            result[key] = changes
+
+        return result
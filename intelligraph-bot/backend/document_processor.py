@@ -1,26 +1,74 @@
 import os
 import spacy
 import json
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
 import logging
 from datetime import datetime
 import requests
 from werkzeug.utils import secure_filename
-import PyPDF2
 import docx
-from bs4 import BeautifulSoup
 import re
+import bisect
+import hashlib
+from itertools import groupby
+from document_store import DocumentStore
+from vector_index import TextEmbedder, VectorIndex
+from pdf_extractor import StreamingPDFExtractor
+from keyword_engine import KeywordEngine
+from extraction_cache import ExtractionCache, split_content_defined
+from upload_stream import UploadSpool, read_text
+from html_extractor import extract_html_text
+from ingest_profiler import IngestProfile, IngestMetrics
+from summarizer import TextRankSummarizer
+from document_registry import DocumentRegistry
 
 logger = logging.getLogger(__name__)
 
+# Pipeline components each processing output depends on; anything else is disabled
+NLP_OUTPUTS = {
+    'entities': {'tok2vec', 'ner'},
+    # Relation types are named after verb lemmas, which need POS tags and the lemmatizer
+    'relations': {'tok2vec', 'tagger', 'attribute_ruler', 'lemmatizer', 'parser', 'ner'},
+    'keywords': {'tok2vec', 'tagger', 'attribute_ruler', 'parser'},
+    'keyword_counts': {'tok2vec', 'tagger', 'attribute_ruler', 'parser'},
+    'summary': set()
+}
+
+def document_key(path: str) -> str:
+    """Turn a client-supplied relative path into a document key, securing each component"""
+    parts = (secure_filename(part) for part in re.split(r'[\\/]', path or ''))
+    return '/'.join(part for part in parts if part)
+
+def sentence_boundaries(text: str) -> List[int]:
+    """Get the sorted offsets where sentences or paragraphs end, plus both ends of the text"""
+    return sorted({0, len(text)} | {m.end() for m in re.finditer(r'[.!?]\s+|\n\s*\n', text)})
+
 class DocumentProcessor:
     """Process and analyze documents for knowledge extraction"""
     
-    def __init__(self):
+    def __init__(self, storage: bool = True):
         self.setup_nlp()
         self.supported_formats = ['.pdf', '.docx', '.txt', '.md', '.html']
-        self.processed_documents = []
         self.allowed_extensions = {"pdf", "docx", "txt"}
+        self.relation_patterns = set(os.getenv('RELATION_PATTERNS', 'direct,svo,prep,appos').split(','))
+        self.keyword_engine = KeywordEngine()
+        self.summarizer = TextRankSummarizer()
+        self.ingest_metrics = IngestMetrics()
+        
+        if storage:
+            self.document_store = DocumentStore()
+            self.registry = DocumentRegistry()
+            self.pdf_extractor = StreamingPDFExtractor()
+            self.extraction_cache = ExtractionCache()
+            self.setup_vector_search()
+        else:
+            # Extraction-only instance for worker processes: no stores and no nested pools
+            self.document_store = None
+            self.registry = None
+            self.pdf_extractor = StreamingPDFExtractor(workers=1)
+            self.extraction_cache = None
+            self.embedder = None
+            self.vector_index = None
     
     def setup_nlp(self):
         """Initialize NLP models"""
@@ -32,44 +80,115 @@ class DocumentProcessor:
             logger.warning("spaCy model not found, using basic processing")
             self.nlp = None
     
-    def process_uploaded_file(self, file) -> Dict[str, Any]:
-        """Process an uploaded file and extract knowledge"""
+    def setup_vector_search(self):
+        """Initialize the embedding model and vector index"""
+        self.embedder = TextEmbedder()
+        if self.embedder.model is not None:
+            self.vector_index = VectorIndex(dim=self.embedder.dim)
+        else:
+            self.vector_index = None
+    
+    def process_uploaded_file(self, file, profile: IngestProfile = None, path: str = None) -> Dict[str, Any]:
+        """Process an uploaded file and extract knowledge, timing each stage in profile.
+        
+        The document is identified by path (the file's path relative to the client's upload
+        root) when given, so same-named files from different folders stay separate documents.
+        """
+        profile = profile or IngestProfile(track_memory=False)
         try:
-            filename = secure_filename(file.filename)
-            file_extension = os.path.splitext(filename)[1].lower()
+            file_extension = os.path.splitext(secure_filename(file.filename))[1].lower()
+            filename = document_key(path) or secure_filename(file.filename)
             
             if file_extension not in self.supported_formats:
                 raise ValueError(f"Unsupported file format: {file_extension}")
             
-            # Extract text from file
-            text_content = self.extract_text_from_file(file, file_extension)
-            
-            # Process the text
-            processed_data = self.process_text(text_content, filename)
-            
-            # Store processed document info
-            doc_info = {
-                'filename': filename,
-                'processed_at': datetime.now().isoformat(),
-                'entities_count': len(processed_data.get('entities', [])),
-                'relations_count': len(processed_data.get('relations', [])),
-                'word_count': len(text_content.split()),
-                'file_type': file_extension
-            }
-            
-            self.processed_documents.append(doc_info)
-            
-            return {
-                **processed_data,
-                'document_info': doc_info
-            }
+            # Copy the upload to a spool (hashing it and enforcing the size limit on the way)
+            with profile.stage('spool') as items:
+                upload = UploadSpool(file)
+                items['bytes'] = upload.size
+            with upload:
+                return self.process_spooled_upload(upload, filename, file_extension, profile)
             
         except Exception as e:
             logger.error(f"File processing error: {str(e)}")
             raise
     
+    def process_spooled_upload(self, upload: UploadSpool, filename: str, file_extension: str,
+                               profile: IngestProfile) -> Dict[str, Any]:
+        """Extract knowledge from a spooled upload, reusing cached results where possible"""
+        # Identical uploads reuse the earlier result and skip extraction entirely
+        content_hash = upload.content_hash
+        with profile.stage('cache_lookup'):
+            cached = self.extraction_cache.get_file(self.file_cache_key(content_hash))
+            current = self.document_store.current_version(filename) if cached is not None else None
+        # Only a re-upload of the document's current version is a duplicate. Content seen
+        # before (an older version, or another document) is stored as a new version, with
+        # its extraction served from the chunk cache below.
+        if current is not None and current['content_hash'] == content_hash:
+            logger.info(f"Duplicate upload {filename}, using cached extraction")
+            cached['document_info'] = {**cached['document_info'], 'filename': filename, 'duplicate': True,
+                                       'document_id': current['document_id'], 'version': current['version']}
+            return cached
+        
+        # Extract text from file
+        with profile.stage('extract_text') as items:
+            text_content = self.extract_text_from_file(upload.source, file_extension)
+            items['characters'] = len(text_content)
+        
+        # Keep the text searchable; a new version of an earlier upload only adds its changed chunks
+        with profile.stage('document_store') as items:
+            stored = self.document_store.add_document_version(filename, text_content, file_extension)
+            document_id = stored['document_id']
+            items.update(characters=len(text_content), new_chunks=len(stored['new_chunk_ids']),
+                         removed_chunks=stored['removed_chunks'])
+        with profile.stage('vector_index') as items:
+            self.index_document_vectors(document_id, stored['new_chunk_ids'], stored['removed_chunk_ids'])
+            items.update(chunks=len(stored['new_chunk_ids']), removed=len(stored['removed_chunk_ids']))
+        
+        # Process the text, reusing results for chunks seen in earlier uploads
+        processed_data = self.process_text_cached(text_content, filename, profile, document=filename)
+        reused_chunks = processed_data.pop('reused_chunks', 0)
+        
+        # Store processed document info
+        doc_info = {
+            'filename': filename,
+            'processed_at': datetime.now().isoformat(),
+            'entities_count': len(processed_data.get('entities', [])),
+            'relations_count': len(processed_data.get('relations', [])),
+            'word_count': len(text_content.split()),
+            'file_type': file_extension,
+            'document_id': document_id,
+            'version': stored['version'],
+            'content_hash': content_hash,
+            'reused_chunks': reused_chunks,
+            'duplicate': False
+        }
+        
+        # Registered and cached by record_upload, once the caller has updated the graph
+        return {
+            **processed_data,
+            'document_info': doc_info
+        }
+    
+    def record_upload(self, result: Dict[str, Any], profile: IngestProfile = None):
+        """Register a processed upload and cache its extraction, once its facts are in the graph.
+        
+        Until then the stored version has no content hash, so re-uploading the same file
+        is processed again rather than treated as a duplicate.
+        """
+        profile = profile or IngestProfile(track_memory=False)
+        doc_info = result['document_info']
+        with profile.stage('registry'):
+            self.registry.register(doc_info)
+            self.document_store.set_content_hash(doc_info['document_id'], doc_info['content_hash'])
+            self.extraction_cache.put_file(self.file_cache_key(doc_info['content_hash']), result)
+    
+    def file_cache_key(self, content_hash: str) -> str:
+        """Get the extraction cache key of a whole file, which depends on the extractor too"""
+        return hashlib.sha256(f"{self.extraction_version()}\n{content_hash}".encode('utf-8')).hexdigest()
+    
     def extract_text_from_file(self, file, file_extension: str) -> str:
-        """Extract text content from different file formats"""
+        """Extract text content from different file formats (file is a path or file object)"""
         try:
             if file_extension == '.pdf':
                 return self.extract_text_from_pdf(file)
@@ -78,7 +197,7 @@ class DocumentProcessor:
             elif file_extension == '.html':
                 return self.extract_text_from_html(file)
             elif file_extension in ['.txt', '.md']:
-                return file.read().decode('utf-8')
+                return read_text(file)
             else:
                 raise ValueError(f"Unsupported file format: {file_extension}")
                 
@@ -86,21 +205,29 @@ class DocumentProcessor:
             logger.error(f"Text extraction error: {str(e)}")
             raise
     
+    def extract_text_from_path(self, file_path: str) -> str:
+        """Extract text content from a file on disk"""
+        file_extension = os.path.splitext(file_path)[1].lower()
+        return self.extract_text_from_file(file_path, file_extension)
+    
     def extract_text_from_pdf(self, file) -> str:
-        """Extract text from PDF file"""
+        """Extract the whole text of a PDF file.
+        
+        Pages are extracted one at a time (in parallel for large files), but the joined text
+        is needed as a whole for storage and chunking. Use iter_pdf_pages to consume pages as
+        they arrive.
+        """
         try:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            
-            return text.strip()
+            return "\n".join(self.iter_pdf_pages(file)).strip()
             
         except Exception as e:
             logger.error(f"PDF extraction error: {str(e)}")
             raise
     
+    def iter_pdf_pages(self, file) -> Iterator[str]:
+        """Stream the text of a PDF (path or file object) one page at a time"""
+        return self.pdf_extractor.iter_pages(file)
+    
     def extract_text_from_docx(self, file) -> str:
         """Extract text from DOCX file"""
         try:
@@ -119,80 +246,286 @@ class DocumentProcessor:
     def extract_text_from_html(self, file) -> str:
         """Extract text from HTML file"""
         try:
-            content = file.read().decode('utf-8')
-            soup = BeautifulSoup(content, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-            
-            text = soup.get_text()
-            
-            # Clean up text
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = '\n'.join(chunk for chunk in chunks if chunk)
-            
-            return text
+            return extract_html_text(file)
             
         except Exception as e:
             logger.error(f"HTML extraction error: {str(e)}")
             raise
     
-    def process_text(self, text: str, source: str = "unknown") -> Dict[str, Any]:
+    def process_text(self, text: str, source: str = "unknown", outputs=None) -> Dict[str, Any]:
         """Process text and extract entities and relationships"""
         try:
-            # Basic text processing
-            processed_data = {
-                'entities': [],
-                'relations': [],
-                'keywords': [],
-                'summary': '',
-                'source': source,
-                'processed_at': datetime.now().isoformat()
-            }
-            
-            if self.nlp:
-                # Advanced NLP processing
-                doc = self.nlp(text)
-                
-                # Extract entities
-                entities = self.extract_entities(doc)
-                processed_data['entities'] = entities
-                
-                # Extract relationships
-                relations = self.extract_relationships(doc)
-                processed_data['relations'] = relations
-                
-                # Extract keywords
-                keywords = self.extract_keywords(doc)
-                processed_data['keywords'] = keywords
-                
-                # Generate summary
-                summary = self.generate_summary(text)
-                processed_data['summary'] = summary
-                
-            else:
-                # Basic processing without spaCy
-                processed_data.update(self.basic_text_processing(text))
-            
-            return processed_data
+            return next(self.process_texts([text], [source], outputs=outputs, n_process=1))
             
         except Exception as e:
             logger.error(f"Text processing error: {str(e)}")
             raise
     
-    def extract_entities(self, doc) -> List[Dict[str, Any]]:
+    def process_text_cached(self, text: str, source: str = "unknown",
+                            profile: IngestProfile = None, document: str = None) -> Dict[str, Any]:
+        """Process text in content-defined chunks, reusing cached results of unchanged chunks.
+        
+        When document is given, its terms are recorded in the keyword corpus statistics.
+        """
+        profile = profile or IngestProfile(track_memory=False)
+        if not self.nlp:
+            with profile.stage('nlp'):
+                return self.process_text(text, source)
+        
+        with profile.stage('nlp') as items:
+            processed_data = self.analyze_chunks(text, source)
+            items.update(chunks=processed_data['chunk_count'], reused_chunks=processed_data['reused_chunks'],
+                         entities=len(processed_data['entities']), relations=len(processed_data['relations']))
+        
+        with profile.stage('keywords') as items:
+            processed_data['keywords'] = self.keyword_engine.score(processed_data.pop('keyword_counts'),
+                                                                   processed_data.pop('token_count'),
+                                                                   document=document)
+            items['keywords'] = len(processed_data['keywords'])
+        
+        with profile.stage('summary'):
+            processed_data['summary'] = self.generate_summary(text)
+        
+        del processed_data['chunk_count']
+        return processed_data
+    
+    def extraction_version(self) -> str:
+        """Identify the extractor, since cached results depend on it as well as the text"""
+        if not self.nlp:
+            return 'basic'
+        return (f"{self.nlp.meta.get('name')}-{self.nlp.meta.get('version')}:"
+                f"{','.join(sorted(self.relation_patterns))}")
+    
+    def analyze_chunks(self, text: str, source: str) -> Dict[str, Any]:
+        """Extract entities, relations and keyword counts chunk by chunk through the chunk cache"""
+        overlap = int(os.getenv('NLP_CHUNK_OVERLAP', 500))
+        # Spans reach twice the target size and are parsed with overlap on both sides
+        target_size = min(int(os.getenv('EXTRACTION_CACHE_CHUNK_SIZE', 8000)),
+                          (self.nlp.max_length - 2 * overlap) // 2)
+        spans = split_content_defined(text, target_size)
+        
+        # Each span is parsed with surrounding sentences, as in process_long_text, so the
+        # context is part of what a cached result depends on
+        boundaries = sentence_boundaries(text)
+        chunks = [(*self.context_bounds(text, boundaries, start, end, overlap), start, end) for start, end in spans]
+        version = self.extraction_version()
+        hashes = [hashlib.sha256(f"{version}\n{start - context_start}:{end - context_start}\n"
+                                 f"{text[context_start:context_end]}".encode('utf-8')).hexdigest()
+                  for context_start, context_end, start, end in chunks]
+        results = self.extraction_cache.get_chunks(hashes)
+        
+        missing = list({chunk_hash: chunk for chunk_hash, chunk in zip(hashes, chunks)
+                        if chunk_hash not in results}.items())
+        if missing:
+            batch_size = int(os.getenv('NLP_BATCH_SIZE', 64))
+            n_process = int(os.getenv('NLP_N_PROCESS', os.cpu_count() or 1))
+            tasks = ((text[chunk[0]:chunk[1]], (chunk_hash, chunk)) for chunk_hash, chunk in missing)
+            docs = self.nlp.pipe(tasks, as_tuples=True, batch_size=batch_size,
+                                 n_process=n_process if len(missing) >= batch_size * 2 else 1)
+            fresh = {}
+            for doc, (chunk_hash, (context_start, _, start, end)) in docs:
+                owned = (start - context_start, end - context_start)
+                counts, total = self.keyword_engine.count_terms(doc, owned)
+                fresh[chunk_hash] = {
+                    # Entity offsets are kept relative to the span start
+                    'entities': self.extract_entities(doc, owned, context_start - start),
+                    'relations': self.extract_relationships(doc, owned),
+                    'keyword_counts': counts,
+                    'token_count': total
+                }
+            self.extraction_cache.put_chunks(fresh)
+            results.update(fresh)
+        
+        # Merge chunk results in document order, shifting entity offsets into the document
+        processed_data = self.empty_result(source)
+        keyword_counts = {}
+        token_count = 0
+        seen_entities = set()
+        for chunk_hash, (start, _) in zip(hashes, spans):
+            result = results[chunk_hash]
+            for entity in result['entities']:
+                key = (entity['name'].lower(), entity['type'])
+                if key not in seen_entities:
+                    seen_entities.add(key)
+                    processed_data['entities'].append({**entity,
+                                                       'start_char': entity['start_char'] + start,
+                                                       'end_char': entity['end_char'] + start})
+            processed_data['relations'].extend(result['relations'])
+            self.keyword_engine.merge_counts(keyword_counts, result['keyword_counts'])
+            token_count += result['token_count']
+        
+        processed_data['keyword_counts'] = keyword_counts
+        processed_data['token_count'] = token_count
+        processed_data['chunk_count'] = len(spans)
+        processed_data['reused_chunks'] = len(spans) - len(missing)
+        return processed_data
+    
+    def process_texts(self, texts: List[str], sources: List[str] = None, outputs=None,
+                      batch_size: int = None, n_process: int = None) -> Iterator[Dict[str, Any]]:
+        """Process many texts in batches with nlp.pipe, yielding results in input order"""
+        outputs = set(outputs or NLP_OUTPUTS.keys() - {'keyword_counts'})
+        sources = sources or ["unknown"] * len(texts)
+        batch_size = batch_size or int(os.getenv('NLP_BATCH_SIZE', 64))
+        n_process = n_process or int(os.getenv('NLP_N_PROCESS', os.cpu_count() or 1))
+        
+        if not self.nlp:
+            # Basic processing without spaCy
+            for text, source in zip(texts, sources):
+                processed_data = self.empty_result(source)
+                processed_data.update(self.basic_text_processing(text))
+                yield processed_data
+            return
+        
+        # Long documents are chunked; runs of ordinary texts are batched together
+        chunk_size = int(os.getenv('NLP_CHUNK_SIZE', 100000))
+        items = zip(texts, sources)
+        for is_long, run in groupby(items, key=lambda item: len(item[0]) > chunk_size):
+            run = list(run)
+            if is_long:
+                for text, source in run:
+                    yield self.process_long_text(text, source, outputs, n_process)
+                continue
+            
+            # Worker processes only pay off when there are several batches to share out
+            run_processes = n_process if len(run) >= batch_size * 2 else 1
+            docs = self.nlp.pipe(run, as_tuples=True, batch_size=batch_size,
+                                 n_process=run_processes, disable=self.components_to_disable(outputs))
+            for (doc, source), (text, _) in zip(docs, run):
+                yield self.analyze_doc(doc, text, source, outputs)
+    
+    def plan_chunks(self, text: str, chunk_size: int, overlap: int) -> List[tuple]:
+        """Split text into sentence-aligned (context start, own start, own end, context end) chunks"""
+        # Chunks own disjoint spans that together cover the text, and are parsed with up
+        # to `overlap` characters of surrounding sentences for context
+        boundaries = sentence_boundaries(text)
+        
+        chunks = []
+        start = 0
+        while start < len(text):
+            target = min(start + chunk_size, len(text))
+            end = boundaries[bisect.bisect_right(boundaries, target) - 1]
+            if end <= start:
+                # A single sentence longer than a chunk: cut at the last space instead
+                space = text.rfind(' ', start + 1, target)
+                end = space + 1 if space > start else target
+            
+            context_start, context_end = self.context_bounds(text, boundaries, start, end, overlap)
+            chunks.append((context_start, start, end, context_end))
+            start = end
+        
+        return chunks
+    
+    def context_bounds(self, text: str, boundaries: List[int], start: int, end: int, overlap: int) -> tuple:
+        """Widen a span to the sentence boundaries at most `overlap` characters beyond it"""
+        context_start = boundaries[bisect.bisect_left(boundaries, max(0, start - overlap))]
+        context_end = boundaries[bisect.bisect_right(boundaries, min(len(text), end + overlap)) - 1]
+        return min(context_start, start), max(context_end, end)
+    
+    def process_long_text(self, text: str, source: str, outputs, n_process: int) -> Dict[str, Any]:
+        """Process a long text in overlapping chunks and merge results into document offsets"""
+        chunk_size = int(os.getenv('NLP_CHUNK_SIZE', 100000))
+        overlap = int(os.getenv('NLP_CHUNK_OVERLAP', 500))
+        chunks = self.plan_chunks(text, chunk_size, overlap)
+        
+        processed_data = self.empty_result(source)
+        keyword_counts = {}
+        token_count = 0
+        seen_entities = set()
+        
+        # Chunks are large, so hand them to workers one at a time
+        tasks = ((text[chunk[0]:chunk[3]], chunk) for chunk in chunks)
+        docs = self.nlp.pipe(tasks, as_tuples=True, batch_size=1,
+                             n_process=n_process if len(chunks) > 1 else 1,
+                             disable=self.components_to_disable(outputs))
+        
+        for doc, (context_start, start, end, _) in docs:
+            owned = (start - context_start, end - context_start)
+            
+            if 'entities' in outputs:
+                for entity in self.extract_entities(doc, owned, context_start):
+                    key = (entity['name'].lower(), entity['type'])
+                    if key not in seen_entities:
+                        seen_entities.add(key)
+                        processed_data['entities'].append(entity)
+            
+            if 'relations' in outputs:
+                processed_data['relations'].extend(self.extract_relationships(doc, owned))
+            
+            if outputs & {'keywords', 'keyword_counts'}:
+                counts, total = self.keyword_engine.count_terms(doc, owned)
+                self.keyword_engine.merge_counts(keyword_counts, counts)
+                token_count += total
+        
+        # Score once over the whole document so it counts as a single document for IDF
+        if 'keywords' in outputs:
+            processed_data['keywords'] = self.keyword_engine.score(keyword_counts, token_count)
+        if 'keyword_counts' in outputs:
+            processed_data['keyword_counts'] = keyword_counts
+            processed_data['token_count'] = token_count
+        
+        if 'summary' in outputs:
+            processed_data['summary'] = self.generate_summary(text)
+        
+        return processed_data
+    
+    def components_to_disable(self, outputs) -> List[str]:
+        """Get the pipeline components that none of the requested outputs need"""
+        required = set()
+        for output in outputs:
+            required.update(NLP_OUTPUTS[output])
+        return [name for name in self.nlp.pipe_names if name not in required]
+    
+    def empty_result(self, source: str) -> Dict[str, Any]:
+        """Create an empty processing result"""
+        return {
+            'entities': [],
+            'relations': [],
+            'keywords': [],
+            'summary': '',
+            'source': source,
+            'processed_at': datetime.now().isoformat()
+        }
+    
+    def analyze_doc(self, doc, text: str, source: str, outputs) -> Dict[str, Any]:
+        """Extract the requested outputs from a parsed spaCy doc"""
+        processed_data = self.empty_result(source)
+        
+        # Extract entities
+        if 'entities' in outputs:
+            processed_data['entities'] = self.extract_entities(doc)
+        
+        # Extract relationships
+        if 'relations' in outputs:
+            processed_data['relations'] = self.extract_relationships(doc)
+        
+        # Extract keywords
+        if 'keywords' in outputs:
+            processed_data['keywords'] = self.extract_keywords(doc)
+        
+        # Raw keyword counts, for scoring later in the process that owns the corpus statistics
+        if 'keyword_counts' in outputs:
+            processed_data['keyword_counts'], processed_data['token_count'] = self.keyword_engine.count_terms(doc)
+        
+        # Generate summary
+        if 'summary' in outputs:
+            processed_data['summary'] = self.generate_summary(text)
+        
+        return processed_data
+    
+    def extract_entities(self, doc, owned=None, offset: int = 0) -> List[Dict[str, Any]]:
         """Extract named entities from spaCy doc"""
         entities = []
         
         for ent in doc.ents:
+            # In a chunk of a longer document, only keep entities starting in its own span
+            if owned and not owned[0] <= ent.start_char < owned[1]:
+                continue
             entity = {
                 'name': ent.text,
                 'type': ent.label_,
                 'description': spacy.explain(ent.label_),
-                'start_char': ent.start_char,
-                'end_char': ent.end_char,
+                'start_char': ent.start_char + offset,
+                'end_char': ent.end_char + offset,
                 'confidence': 0.8  # Default confidence
             }
             entities.append(entity)
@@ -209,131 +542,85 @@ class DocumentProcessor:
         
         return unique_entities
     
-    def extract_relationships(self, doc) -> List[Dict[str, Any]]:
-        """Extract relationships between entities"""
+    def extract_relationships(self, doc, owned=None) -> List[Dict[str, Any]]:
+        """Extract typed relationships between entities in one pass over the parse"""
         relationships = []
+        ents = list(doc.ents)
+        if len(ents) < 2:
+            return relationships
         
-        # Simple relationship extraction based on dependency parsing
-        for sent in doc.sents:
-            for token in sent:
-                if token.dep_ in ["nsubj", "dobj", "pobj"]:
-                    # Find related entities
-                    head = token.head
-                    
-                    # Check if both token and head are entities
-                    token_ent = self.find_entity_for_token(token, doc.ents)
-                    head_ent = self.find_entity_for_token(head, doc.ents)
-                    
-                    if token_ent and head_ent and token_ent != head_ent:
-                        relationship = {
-                            'source': token_ent.text,
-                            'target': head_ent.text,
-                            'type': token.dep_,
-                            'description': f"{token_ent.text} {token.dep_} {head_ent.text}",
-                            'confidence': 0.7
-                        }
-                        relationships.append(relationship)
+        # Token -> entity lookup instead of scanning doc.ents for every token
+        token_entity = [-1] * len(doc)
+        for ent_id, ent in enumerate(ents):
+            for i in range(ent.start, ent.end):
+                token_entity[i] = ent_id
         
-        return relationships
-    
-    def find_entity_for_token(self, token, entities):
-        """Find entity that contains the given token"""
-        for ent in entities:
-            if ent.start <= token.i < ent.end:
-                return ent
-        return None
-    
-    def extract_keywords(self, doc) -> List[Dict[str, Any]]:
-        """Extract important keywords from text"""
-        keywords = []
-        
-        # Extract noun phrases
-        for chunk in doc.noun_chunks:
-            if len(chunk.text.split()) <= 3:  # Limit to 3 words
-                keyword = {
-                    'text': chunk.text,
-                    'type': 'noun_phrase',
-                    'importance': self.calculate_keyword_importance(chunk.text, doc.text)
-                }
-                keywords.append(keyword)
+        patterns = self.relation_patterns
+        subjects = {}      # verb index -> subject entity ids
+        objects = {}       # verb index -> (object entity id, relation type, pattern)
         
-        # Extract important single words
-        for token in doc:
-            if (token.pos_ in ["NOUN", "PROPN", "ADJ"] and 
-                not token.is_stop and 
-                not token.is_punct and 
-                len(token.text) > 2):
-                
-                keyword = {
-                    'text': token.text,
-                    'type': token.pos_,
-                    'importance': self.calculate_keyword_importance(token.text, doc.text)
-                }
-                keywords.append(keyword)
+        def add(source_id, target_id, rel_type, pattern, anchor):
+            if source_id == target_id or (owned and not owned[0] <= anchor.idx < owned[1]):
+                return
+            source, target = ents[source_id].text, ents[target_id].text
+            relationships.append({
+                'source': source,
+                'target': target,
+                'type': rel_type,
+                'pattern': pattern,
+                'description': f"{source} {rel_type} {target}",
+                'confidence': 0.7
+            })
         
-        # Sort by importance and remove duplicates
-        unique_keywords = []
-        seen = set()
+        for token in doc:
+            ent_id = token_entity[token.i]
+            if ent_id == -1:
+                continue
+            dep = token.dep_
+            head = token.head
+            head_ent = token_entity[head.i]
+            
+            # Direct: the entity's syntactic head is itself (in) another entity
+            if 'direct' in patterns and dep in ("nsubj", "dobj", "pobj") and head_ent != -1:
+                add(ent_id, head_ent, dep, 'direct', token)
+            
+            # Subject-verb-object: collect both sides per verb, pair them after the pass
+            if head.pos_ in ("VERB", "AUX"):
+                if dep in ("nsubj", "nsubjpass"):
+                    subjects.setdefault(head.i, []).append(ent_id)
+                elif 'svo' in patterns and dep in ("dobj", "attr", "dative"):
+                    objects.setdefault(head.i, []).append((ent_id, head.lemma_ or head.lower_, 'svo'))
+            
+            # Prepositional: X -prep-> "in" -pobj-> Y, where X is an entity or a verb
+            if 'prep' in patterns and dep == "pobj" and head.dep_ == "prep":
+                governor = head.head
+                verb = governor.lemma_ or governor.lower_
+                rel_type = f"{verb}_{head.lower_}" if governor.pos_ in ("VERB", "AUX") else head.lower_
+                if token_entity[governor.i] != -1:
+                    add(token_entity[governor.i], ent_id, rel_type, 'prep', token)
+                elif governor.pos_ in ("VERB", "AUX"):
+                    objects.setdefault(governor.i, []).append((ent_id, rel_type, 'prep'))
+            
+            # Appositive: "Sundar Pichai, the CEO of Google"
+            if 'appos' in patterns and dep == "appos" and head_ent != -1:
+                add(head_ent, ent_id, 'appos', 'appos', token)
         
-        for keyword in sorted(keywords, key=lambda x: x['importance'], reverse=True):
-            if keyword['text'].lower() not in seen:
-                seen.add(keyword['text'].lower())
-                unique_keywords.append(keyword)
+        for verb_i, verb_objects in objects.items():
+            for subject_id in subjects.get(verb_i, []):
+                for object_id, rel_type, pattern in verb_objects:
+                    add(subject_id, object_id, rel_type, pattern, doc[verb_i])
         
-        return unique_keywords[:50]  # Return top 50 keywords
+        return relationships
     
-    def calculate_keyword_importance(self, keyword: str, text: str) -> float:
-        """Calculate importance score for a keyword"""
-        # Simple TF-IDF-like scoring
-        keyword_lower = keyword.lower()
-        text_lower = text.lower()
-        
-        # Term frequency
-        tf = text_lower.count(keyword_lower) / len(text_lower.split())
-        
-        # Length bonus (longer keywords are often more important)
-        length_bonus = min(len(keyword.split()), 3) * 0.1
-        
-        # Position bonus (keywords at the beginning are often more important)
-        position_bonus = 0.1 if text_lower.index(keyword_lower) < len(text_lower) * 0.2 else 0
-        
-        return tf + length_bonus + position_bonus
+    def extract_keywords(self, doc) -> List[Dict[str, Any]]:
+        """Extract important keywords from text, scored by TF-IDF against the corpus"""
+        candidates, total = self.keyword_engine.count_terms(doc)
+        return self.keyword_engine.score(candidates, total)
     
     def generate_summary(self, text: str, max_sentences: int = 3) -> str:
-        """Generate a simple extractive summary"""
+        """Generate an extractive summary (TextRank, cached per document)"""
         try:
-            sentences = re.split(r'[.!?]+', text)
-            sentences = [s.strip() for s in sentences if len(s.strip()) > 10]
-            
-            if len(sentences) <= max_sentences:
-                return '. '.join(sentences)
-            
-            # Simple scoring based on sentence length and position
-            scored_sentences = []
-            
-            for i, sentence in enumerate(sentences):
-                # Position score (earlier sentences are more important)
-                position_score = 1.0 / (i + 1)
-                
-                # Length score (medium-length sentences are preferred)
-                length_score = min(len(sentence.split()) / 20, 1.0)
-                
-                total_score = position_score * 0.6 + length_score * 0.4
-                
-                scored_sentences.append((sentence, total_score))
-            
-            # Select top sentences
-            top_sentences = sorted(scored_sentences, key=lambda x: x[1], reverse=True)[:max_sentences]
-            
-            # Maintain original order
-            summary_sentences = []
-            for sentence, _ in top_sentences:
-                original_index = sentences.index(sentence)
-                summary_sentences.append((original_index, sentence))
-            
-            summary_sentences.sort(key=lambda x: x[0])
-            
-            return '. '.join([sentence for _, sentence in summary_sentences])
+            return self.summarizer.summarize(text, max_sentences)
             
         except Exception as e:
             logger.error(f"Summary generation error: {str(e)}")
@@ -355,20 +642,9 @@ class DocumentProcessor:
                         'confidence': 0.5
                     })
             
-            # Extract keywords (frequent words)
-            word_freq = {}
-            for word in words:
-                word_lower = word.lower()
-                if len(word_lower) > 3 and word_lower.isalpha():
-                    word_freq[word_lower] = word_freq.get(word_lower, 0) + 1
-            
-            keywords = []
-            for word, freq in sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:20]:
-                keywords.append({
-                    'text': word,
-                    'type': 'WORD',
-                    'importance': freq / len(words)
-                })
+            # Extract keywords (frequent words, weighted by corpus rarity)
+            candidates, total = self.keyword_engine.count_words(words)
+            keywords = self.keyword_engine.score(candidates, total, limit=20)
             
             return {
                 'entities': entities[:50],  # Limit to 50 entities
@@ -386,70 +662,62 @@ class DocumentProcessor:
                 'summary': ''
             }
     
-    def search_documents(self, query: str) -> List[Dict[str, Any]]:
-        """Search processed documents for relevant information"""
+    def index_document_vectors(self, document_id: int, chunk_ids: List[int] = None,
+                               removed_chunk_ids: List[int] = None):
+        """Embed a stored document's chunks (or only the given ones) in batches and add them to the vector index.
+        
+        Vectors of chunks an earlier version had and this one dropped are deleted.
+        """
+        if self.vector_index is None:
+            return
+        
         try:
-            results = []
-            query_lower = query.lower()
-            
-            # This is a placeholder - in a real implementation, you'd search
-            # through stored document content, possibly using vector search
-            
-            # For now, return some mock results
-            mock_results = [
-                {
-                    'title': 'AI Research Document',
-                    'snippet': 'This document discusses artificial intelligence and machine learning approaches...',
-                    'relevance': 0.9,
-                    'source': 'research_paper.pdf'
-                },
-                {
-                    'title': 'Knowledge Graph Guide',
-                    'snippet': 'A comprehensive guide to building and using knowledge graphs...',
-                    'relevance': 0.8,
-                    'source': 'kg_guide.docx'
-                }
-            ]
-            
-            # Filter results based on query
-            for result in mock_results:
-                if any(word in result['snippet'].lower() for word in query_lower.split()):
-                    results.append(result)
-            
-            return results
+            self.vector_index.delete(removed_chunk_ids or [])
+            chunks = self.document_store.get_chunks(document_id, chunk_ids)
+            if chunks:
+                vectors = self.embedder.embed([text for _, text in chunks])
+                self.vector_index.add([chunk_id for chunk_id, _ in chunks], vectors)
+                
+        except Exception as e:
+            logger.error(f"Vector indexing error: {str(e)}")
+    
+    def search_documents(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Search stored document chunks by keywords and meaning"""
+        try:
+            keyword_results = self.document_store.search(query, limit=limit)
+            if self.vector_index is None:
+                return keyword_results
+            
+            query_vector = self.embedder.embed([query])[0]
+            semantic_results = self.document_store.get_chunk_results(
+                self.vector_index.search(query_vector, k=limit), query)
+            
+            # Reciprocal rank fusion: BM25 and cosine scores are not on the same scale
+            fused = {}
+            for results in (keyword_results, semantic_results):
+                for rank, result in enumerate(results):
+                    entry = fused.setdefault(result['chunk_id'], {**result, 'relevance': 0.0})
+                    entry['relevance'] += 1.0 / (60 + rank + 1)
+            
+            ranked = sorted(fused.values(), key=lambda x: x['relevance'], reverse=True)[:limit]
+            for result in ranked:
+                result['relevance'] = round(result['relevance'], 4)
+            return ranked
             
         except Exception as e:
             logger.error(f"Document search error: {str(e)}")
             return []
     
-    def get_stats(self) -> Dict[str, Any]:
-        """Get document processing statistics"""
+    def get_stats(self, limit: int = 20, before: int = None, file_type: str = None) -> Dict[str, Any]:
+        """Get document processing statistics and one page of processed documents"""
         try:
-            total_docs = len(self.processed_documents)
-            
-            if total_docs == 0:
-                return {
-                    'total_documents': 0,
-                    'total_entities': 0,
-                    'total_relations': 0,
-                    'file_types': {}
-                }
-            
-            total_entities = sum(doc['entities_count'] for doc in self.processed_documents)
-            total_relations = sum(doc['relations_count'] for doc in self.processed_documents)
-            
-            # Count file types
-            file_types = {}
-            for doc in self.processed_documents:
-                file_type = doc['file_type']
-                file_types[file_type] = file_types.get(file_type, 0) + 1
-            
             return {
-                'total_documents': total_docs,
-                'total_entities': total_entities,
-                'total_relations': total_relations,
-                'file_types': file_types,
-                'processed_documents': self.processed_documents
+                **self.registry.get_stats(),
+                'store': self.document_store.get_stats(),
+                'vectors': self.vector_index.get_stats() if self.vector_index else {},
+                'keywords': self.keyword_engine.get_stats(),
+                'extraction_cache': self.extraction_cache.get_stats(),
+                'processed_documents': self.registry.list_documents(limit, before, file_type)
             }
             
         except Exception as e:
@@ -477,12 +745,14 @@ class DocumentProcessor:
             return []
 
     def process_pdf(self, file_path: str) -> List[Dict[str, Any]]:
-        """Extract text from PDF"""
+        """Extract entities from a PDF, parsing each page as soon as it is extracted"""
         try:
-            with open(file_path, "rb") as f:
-                reader = PyPDF2.PdfReader(f)
-                text = "\n".join(page.extract_text() for page in reader.pages)
-                return self.extract_entities(text)
+            if not self.nlp:
+                return []
+            # Only a batch of pages is held at a time, and NLP starts with the first page
+            docs = self.nlp.pipe(self.iter_pdf_pages(file_path), batch_size=8,
+                                 disable=self.components_to_disable({'entities'}))
+            return [{"text": ent.text, "label": ent.label_} for doc in docs for ent in doc.ents]
         except Exception as e:
             logger.error(f"Failed to process PDF: {e}")
             return []
@@ -492,7 +762,7 @@ class DocumentProcessor:
         try:
             doc = docx.Document(file_path)
             text = "\n".join(paragraph.text for paragraph in doc.paragraphs)
-            return self.extract_entities(text)
+            return self.extract_entities_from_text(text)
         except Exception as e:
             logger.error(f"Failed to process DOCX: {e}")
             return []
@@ -502,15 +772,15 @@ class DocumentProcessor:
         try:
             with open(file_path, "r") as f:
                 text = f.read()
-                return self.extract_entities(text)
+                return self.extract_entities_from_text(text)
         except Exception as e:
             logger.error(f"Failed to process TXT: {e}")
             return []
 
-    def extract_entities(self, text: str) -> List[Dict[str, Any]]:
+    def extract_entities_from_text(self, text: str) -> List[Dict[str, Any]]:
         """Extract entities using NLP"""
         try:
-            doc = self.nlp(text)
+            doc = self.nlp(text, disable=self.components_to_disable({'entities'}))
             entities = [
                 {
                     "text": ent.text,
@@ -0,0 +1,142 @@
+import os
+import logging
+from datetime import datetime
+from typing import Dict, Any, Optional
+from sqlalchemy import (create_engine, MetaData, Table, Column, Integer, String,
+                        select, update, insert, event)
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+documents = Table(
+    'processed_documents', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('filename', String(512), nullable=False, index=True),
+    Column('file_type', String(16), nullable=False, index=True),
+    Column('processed_at', String(32), nullable=False, index=True),
+    Column('entities_count', Integer, nullable=False, default=0),
+    Column('relations_count', Integer, nullable=False, default=0),
+    Column('word_count', Integer, nullable=False, default=0),
+    Column('document_id', Integer, index=True),
+    Column('content_hash', String(64), index=True),
+    Column('reused_chunks', Integer, nullable=False, default=0)
+)
+
+# Running totals per file type, so stats never scan the documents table
+type_counters = Table(
+    'document_type_counters', metadata,
+    Column('file_type', String(16), primary_key=True),
+    Column('documents', Integer, nullable=False, default=0),
+    Column('entities', Integer, nullable=False, default=0),
+    Column('relations', Integer, nullable=False, default=0),
+    Column('words', Integer, nullable=False, default=0)
+)
+
+
+class DocumentRegistry:
+    """Durable record of processed documents with pre-aggregated per-type counters"""
+
+    def __init__(self, url: str = None):
+        self.url = url or os.getenv('DOCUMENT_REGISTRY_URL', 'sqlite:///data/registry.db')
+        if self.url.startswith('sqlite:///') and not self.url.startswith('sqlite:///:memory:'):
+            os.makedirs(os.path.dirname(os.path.abspath(self.url[len('sqlite:///'):])), exist_ok=True)
+
+        self.engine = create_engine(self.url, pool_pre_ping=True)
+        if self.engine.dialect.name == 'sqlite':
+            event.listen(self.engine, 'connect', self.configure_sqlite)
+        metadata.create_all(self.engine)
+        # create_all skips indexes added to a table that already exists
+        for index in documents.indexes:
+            index.create(self.engine, checkfirst=True)
+
+    @staticmethod
+    def configure_sqlite(connection, _):
+        """Let several worker processes share the database file"""
+        cursor = connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+
+    def register(self, doc_info: Dict[str, Any]) -> int:
+        """Record a processed document and update its type's counters in one transaction.
+
+        A later version of a document (doc_info['version'] > 1) replaces the counts of the
+        previous one instead of adding another document.
+        """
+        row = {column.name: doc_info[column.name] for column in documents.columns
+               if column.name != 'id' and column.name in doc_info}
+        row.setdefault('processed_at', datetime.now().isoformat())
+        file_type = row['file_type']
+        increments = {
+            'documents': 1,
+            'entities': row.get('entities_count', 0),
+            'relations': row.get('relations_count', 0),
+            'words': row.get('word_count', 0)
+        }
+
+        with self.engine.begin() as connection:
+            if doc_info.get('version', 1) > 1:
+                previous = connection.execute(
+                    select(documents.c.file_type, documents.c.entities_count, documents.c.relations_count,
+                           documents.c.word_count)
+                    .where(documents.c.filename == row['filename'])
+                    .order_by(documents.c.id.desc()).limit(1)
+                ).first()
+                if previous is not None:
+                    self.increment(connection, previous.file_type, {
+                        'documents': -1,
+                        'entities': -previous.entities_count,
+                        'relations': -previous.relations_count,
+                        'words': -previous.word_count
+                    })
+            registry_id = connection.execute(insert(documents).values(**row)).inserted_primary_key[0]
+            self.increment(connection, file_type, increments)
+        return registry_id
+
+    def increment(self, connection, file_type: str, increments: Dict[str, int]):
+        """Add to a file type's counters, creating the row on first use"""
+        statement = (update(type_counters)
+                     .where(type_counters.c.file_type == file_type)
+                     .values({name: type_counters.c[name] + value for name, value in increments.items()}))
+        if connection.execute(statement).rowcount:
+            return
+        try:
+            with connection.begin_nested():
+                connection.execute(insert(type_counters).values(file_type=file_type, **increments))
+        except IntegrityError:
+            # Another writer created the row first
+            connection.execute(statement)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get totals and per-type counts from the counters"""
+        with self.engine.connect() as connection:
+            rows = connection.execute(select(type_counters)).mappings().all()
+
+        return {
+            'total_documents': sum(row['documents'] for row in rows),
+            'total_entities': sum(row['entities'] for row in rows),
+            'total_relations': sum(row['relations'] for row in rows),
+            'file_types': {row['file_type']: row['documents'] for row in rows}
+        }
+
+    def list_documents(self, limit: int = 20, before: Optional[int] = None,
+                       file_type: Optional[str] = None) -> Dict[str, Any]:
+        """List documents newest first, one page at a time (pass next_before to continue)"""
+        query = select(documents).order_by(documents.c.id.desc()).limit(limit + 1)
+        if before is not None:
+            query = query.where(documents.c.id < before)
+        if file_type:
+            query = query.where(documents.c.file_type == file_type)
+
+        with self.engine.connect() as connection:
+            rows = [dict(row) for row in connection.execute(query).mappings()]
+
+        # Fetching one extra row tells whether another page exists without counting
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            'documents': rows,
+            'next_before': rows[-1]['id'] if has_more else None
+        }
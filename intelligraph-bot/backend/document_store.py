@@ -0,0 +1,329 @@
+import os
+import re
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import List, Dict, Any, Iterator, Tuple, Optional
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+from extraction_cache import split_content_defined
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    filename TEXT NOT NULL,
+    file_type TEXT,
+    char_count INTEGER NOT NULL,
+    chunk_count INTEGER NOT NULL,
+    added_at TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    current INTEGER NOT NULL DEFAULT 1,
+    content_hash TEXT
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    document_id INTEGER NOT NULL REFERENCES documents(id),
+    chunk_index INTEGER NOT NULL,
+    start_offset INTEGER NOT NULL,
+    end_offset INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    chunk_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_chunks_document ON chunks(document_id, chunk_index);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+    text,
+    content='chunks',
+    content_rowid='id',
+    tokenize='porter unicode61'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_vocab USING fts5vocab(chunks_fts, 'row');
+CREATE VIRTUAL TABLE IF NOT EXISTS temp.query_fts USING fts5(text, tokenize='porter unicode61');
+CREATE VIRTUAL TABLE IF NOT EXISTS temp.query_vocab USING fts5vocab(query_fts, 'instance');
+"""
+
+
+def chunk_text(text: str, chunk_size: int = 1000) -> Iterator[Tuple[int, int, str]]:
+    """Split text into (start, end, text) chunks at content-defined line and sentence breaks"""
+    # Boundaries depend on the surrounding text rather than on offsets, so a revised
+    # document splits into the same chunks everywhere except around its edits
+    for start, end in split_content_defined(text, chunk_size):
+        chunk = text[start:end]
+        if chunk.strip():
+            yield start, end, chunk
+
+
+class DocumentStore:
+    """Persistent chunk store with a BM25-ranked full-text index (SQLite FTS5)"""
+
+    def __init__(self, path: str = None, chunk_size: int = None, max_df_ratio: float = None):
+        self.path = path or os.getenv('DOCUMENT_STORE_PATH', 'data/documents.db')
+        self.chunk_size = int(chunk_size if chunk_size is not None
+                              else os.getenv('DOCUMENT_CHUNK_SIZE', 1000))
+        self.max_df_ratio = float(max_df_ratio if max_df_ratio is not None
+                                  else os.getenv('DOCUMENT_MAX_DF_RATIO', 0.2))
+        self.df_cache = {}
+        self.df_cache_chunks = 0
+        self.lock = threading.Lock()
+        self.connect()
+
+    def connect(self):
+        """Open the SQLite database and create the schema"""
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.migrate()
+        logger.info(f"Document store opened at {self.path}")
+    
+    def migrate(self):
+        """Add the document version, content hash and chunk hash columns to stores created before them"""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(documents)")}
+        with self.conn:
+            if 'version' not in columns:
+                self.conn.execute("ALTER TABLE documents ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+                self.conn.execute("ALTER TABLE documents ADD COLUMN current INTEGER NOT NULL DEFAULT 1")
+            if 'content_hash' not in columns:
+                self.conn.execute("ALTER TABLE documents ADD COLUMN content_hash TEXT")
+            if 'chunk_hash' not in {row[1] for row in self.conn.execute("PRAGMA table_info(chunks)")}:
+                self.conn.execute("ALTER TABLE chunks ADD COLUMN chunk_hash TEXT")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_filename ON documents(filename, current)")
+
+    def close(self):
+        """Close the database connection"""
+        with self.lock:
+            self.conn.close()
+
+    def add_document(self, filename: str, text: str, file_type: str = None) -> int:
+        """Chunk a document's text and add it to the store and index"""
+        return self.add_document_version(filename, text, file_type)['document_id']
+    
+    def current_version(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Get the id, version and content hash of a document's current version, if stored"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id, version, content_hash FROM documents WHERE filename = ? AND current = 1 "
+                "ORDER BY id DESC LIMIT 1", (filename,)).fetchone()
+        if row is None:
+            return None
+        return {'document_id': row['id'], 'version': row['version'], 'content_hash': row['content_hash']}
+    
+    def set_content_hash(self, document_id: int, content_hash: str):
+        """Record the content hash of a stored version"""
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE documents SET content_hash = ? WHERE id = ?", (content_hash, document_id))
+    
+    def add_document_version(self, filename: str, text: str, file_type: str = None) -> Dict[str, Any]:
+        """Store a document as a new version of any earlier one with the same filename.
+        
+        Chunks whose text is unchanged are moved to the new version as they are, keeping
+        their ids (and so their index and vector entries); only new chunks are inserted
+        and only chunks that disappeared are removed.
+        """
+        chunks = list(chunk_text(text, self.chunk_size))
+        hashes = [hashlib.sha1(chunk.encode('utf-8')).hexdigest() for _, _, chunk in chunks]
+        
+        with self.lock, self.conn:
+            previous = self.conn.execute(
+                "SELECT id, version FROM documents WHERE filename = ? AND current = 1 ORDER BY id DESC LIMIT 1",
+                (filename,)
+            ).fetchone()
+            
+            cursor = self.conn.execute(
+                "INSERT INTO documents (filename, file_type, char_count, chunk_count, added_at, version) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (filename, file_type, len(text), len(chunks), datetime.now().isoformat(),
+                 previous['version'] + 1 if previous else 1)
+            )
+            document_id = cursor.lastrowid
+            
+            # Chunks of the previous version by text hash, reusable by the new version
+            old_chunks = {}
+            if previous:
+                self.conn.execute("UPDATE documents SET current = 0 WHERE id = ?", (previous['id'],))
+                for row in self.conn.execute("SELECT id, chunk_hash FROM chunks WHERE document_id = ?",
+                                             (previous['id'],)):
+                    old_chunks.setdefault(row['chunk_hash'], []).append(row['id'])
+            
+            new_chunk_ids = []
+            for index, ((start, end, chunk), chunk_hash) in enumerate(zip(chunks, hashes)):
+                reusable = old_chunks.get(chunk_hash)
+                if reusable:
+                    self.conn.execute(
+                        "UPDATE chunks SET document_id = ?, chunk_index = ?, start_offset = ?, end_offset = ? "
+                        "WHERE id = ?",
+                        (document_id, index, start, end, reusable.pop())
+                    )
+                    continue
+                
+                cursor = self.conn.execute(
+                    "INSERT INTO chunks (document_id, chunk_index, start_offset, end_offset, text, chunk_hash) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (document_id, index, start, end, chunk, chunk_hash)
+                )
+                self.conn.execute("INSERT INTO chunks_fts (rowid, text) VALUES (?, ?)",
+                                  (cursor.lastrowid, chunk))
+                new_chunk_ids.append(cursor.lastrowid)
+            
+            removed = [chunk_id for ids in old_chunks.values() for chunk_id in ids]
+            for chunk_id in removed:
+                # External-content FTS5 tables need the old text to remove an entry
+                self.conn.execute(
+                    "INSERT INTO chunks_fts (chunks_fts, rowid, text) "
+                    "SELECT 'delete', id, text FROM chunks WHERE id = ?", (chunk_id,))
+                self.conn.execute("DELETE FROM chunks WHERE id = ?", (chunk_id,))
+        
+        logger.info(f"Stored {filename}: {len(chunks)} chunks, {len(new_chunk_ids)} new, {len(removed)} removed")
+        return {
+            'document_id': document_id,
+            'version': previous['version'] + 1 if previous else 1,
+            'new_chunk_ids': new_chunk_ids,
+            'reused_chunks': len(chunks) - len(new_chunk_ids),
+            'removed_chunks': len(removed),
+            'removed_chunk_ids': removed
+        }
+    
+    def build_match_query(self, query: str) -> str:
+        """Turn free text into an FTS5 query over its selective terms"""
+        words = [word for word in dict.fromkeys(re.findall(r'\w+', query.lower()))
+                 if word not in ENGLISH_STOP_WORDS][:32]
+        if not words:
+            return ''
+
+        # Terms found in most chunks barely change the BM25 ranking but force FTS5 to
+        # score every posting, so leave them out unless nothing selective remains
+        total = self.conn.execute("SELECT max(rowid) FROM chunks").fetchone()[0] or 0
+        frequencies = self.document_frequencies(words, total)
+        # Small corpora are cheap to score in full, so only prune at scale
+        max_df = max(total * self.max_df_ratio, 1000)
+        selective = [word for word in words if frequencies[word] <= max_df]
+
+        if selective:
+            return ' OR '.join(f'"{word}"' for word in selective)
+        # Only common terms: match them as a phrase, the most selective reading
+        return '"' + ' '.join(words) + '"'
+
+    def document_frequencies(self, words: List[str], total: int) -> Dict[str, int]:
+        """Get the number of chunks containing each word (after stemming), cached"""
+        if total > self.df_cache_chunks * 1.1:
+            # Refresh once the corpus has grown enough for frequencies to drift
+            self.df_cache = {}
+            self.df_cache_chunks = total
+
+        missing = [word for word in words if word not in self.df_cache]
+        if missing:
+            # Run the words through the same tokenizer as the index to get their stems
+            self.conn.execute("DELETE FROM temp.query_fts")
+            for index, word in enumerate(missing):
+                self.conn.execute("INSERT INTO temp.query_fts (rowid, text) VALUES (?, ?)",
+                                  (index + 1, word))
+            stems = dict(self.conn.execute("SELECT doc, term FROM temp.query_vocab").fetchall())
+
+            for index, word in enumerate(missing):
+                row = self.conn.execute("SELECT doc FROM chunks_vocab WHERE term = ?",
+                                        (stems.get(index + 1, word),)).fetchone()
+                self.df_cache[word] = row[0] if row else 0
+
+        return {word: self.df_cache[word] for word in words}
+
+    def search(self, query: str, limit: int = 10, snippet_length: int = 240) -> List[Dict[str, Any]]:
+        """Search chunks with BM25 ranking and return snippets with document offsets"""
+        with self.lock:
+            match_query = self.build_match_query(query)
+            if not match_query:
+                return []
+
+            rows = self.conn.execute(
+                """
+                SELECT c.id, c.document_id, c.chunk_index, c.start_offset, c.text,
+                       d.filename, hits.rank AS score
+                FROM (
+                    SELECT rowid, rank FROM chunks_fts
+                    WHERE chunks_fts MATCH ?
+                    ORDER BY rank
+                    LIMIT ?
+                ) hits
+                JOIN chunks c ON c.id = hits.rowid
+                JOIN documents d ON d.id = c.document_id
+                ORDER BY hits.rank
+                """,
+                (match_query, limit)
+            ).fetchall()
+
+        # FTS5 rank is the negated BM25 score so that smaller is better
+        return [self.format_result(row, query, -row['score'], snippet_length) for row in rows]
+
+    def get_chunks(self, document_id: int, chunk_ids: List[int] = None) -> List[Tuple[int, str]]:
+        """Get the (chunk id, text) pairs of a document in order, optionally only some of them"""
+        with self.lock:
+            rows = [tuple(row) for row in self.conn.execute(
+                "SELECT id, text FROM chunks WHERE document_id = ? ORDER BY chunk_index",
+                (document_id,)
+            )]
+        if chunk_ids is not None:
+            wanted = set(chunk_ids)
+            rows = [row for row in rows if row[0] in wanted]
+        return rows
+
+    def get_chunk_results(self, chunk_scores: List[Tuple[int, float]], query: str,
+                          snippet_length: int = 240) -> List[Dict[str, Any]]:
+        """Format (chunk id, score) hits from another index as search results"""
+        if not chunk_scores:
+            return []
+
+        with self.lock:
+            rows = self.conn.execute(
+                f"""
+                SELECT c.id, c.document_id, c.chunk_index, c.start_offset, c.text, d.filename
+                FROM chunks c JOIN documents d ON d.id = c.document_id
+                WHERE c.id IN ({','.join('?' * len(chunk_scores))})
+                """,
+                [chunk_id for chunk_id, _ in chunk_scores]
+            ).fetchall()
+
+        rows_by_id = {row['id']: row for row in rows}
+        return [self.format_result(rows_by_id[chunk_id], query, score, snippet_length)
+                for chunk_id, score in chunk_scores if chunk_id in rows_by_id]
+
+    def format_result(self, row, query: str, relevance: float, snippet_length: int) -> Dict[str, Any]:
+        """Build a search result with a snippet and document-global offsets"""
+        terms = [term for term in re.findall(r'\w+', query.lower()) if term not in ENGLISH_STOP_WORDS]
+        snippet_start, snippet_end = self.snippet_window(row['text'], terms, snippet_length)
+        return {
+            'title': row['filename'],
+            'snippet': row['text'][snippet_start:snippet_end].strip(),
+            'relevance': round(relevance, 4),
+            'source': row['filename'],
+            'document_id': row['document_id'],
+            'chunk_id': row['id'],
+            'chunk_index': row['chunk_index'],
+            'start_offset': row['start_offset'] + snippet_start,
+            'end_offset': row['start_offset'] + snippet_end
+        }
+
+    def snippet_window(self, text: str, terms: List[str], length: int) -> Tuple[int, int]:
+        """Find a window of the given length around the first query term in text"""
+        text_lower = text.lower()
+        hits = [match.start() for term in terms
+                for match in [re.search(r'\b' + re.escape(term), text_lower)] if match]
+        center = min(hits) if hits else 0
+
+        start = max(0, center - length // 3)
+        end = min(len(text), start + length)
+        start = max(0, end - length)
+        return start, end
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get document and chunk counts"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT count(*) AS documents, coalesce(sum(chunk_count), 0) AS chunks, "
+                "coalesce(sum(char_count), 0) AS characters FROM documents WHERE current = 1"
+            ).fetchone()
+        return dict(row)
@@ -0,0 +1,163 @@
+import os
+import re
+import json
+import zlib
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import List, Dict, Any, Tuple, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    hash TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    last_used TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS chunks (
+    hash TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    last_used TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_files_last_used ON files(last_used);
+CREATE INDEX IF NOT EXISTS idx_chunks_last_used ON chunks(last_used);
+"""
+
+
+def split_content_defined(text: str, target_size: int = 8000) -> List[Tuple[int, int]]:
+    """Split text into (start, end) spans whose boundaries depend on content, not position"""
+    # A span ends after a line whose checksum hits the mask, so an edit only moves the
+    # boundaries next to it and the rest of a revised document splits the same way
+    min_size, max_size = target_size // 2, target_size * 2
+    spans = []
+    start = 0
+    position = 0
+
+    for match in re.finditer(r'[^\n]*\n|[^\n]+$', text):
+        line_start, line_end = match.start(), match.end()
+        # Very long lines (text without line breaks) fall back to sentence boundaries,
+        # and sentences longer than a span to word boundaries
+        pieces = [line_end]
+        if line_end - line_start > max_size:
+            pieces = bound_pieces(text, line_start, [line_start + m.end() for m in
+                                  re.finditer(r'.+?(?:[.!?]\s+|$)', text[line_start:line_end], re.S)], max_size)
+
+        for piece_end in pieces:
+            # Close the span early rather than let a piece push it past the maximum
+            if piece_end - start > max_size and position > start:
+                spans.append((start, position))
+                start = position
+            size = piece_end - start
+            piece = text[position:piece_end]
+            position = piece_end
+            if size >= max_size or (size >= min_size and zlib.crc32(piece.encode('utf-8')) % 4 == 0):
+                spans.append((start, piece_end))
+                start = piece_end
+
+    if start < len(text):
+        spans.append((start, len(text)))
+    return spans
+
+
+def bound_pieces(text: str, start: int, ends: List[int], max_size: int) -> List[int]:
+    """Split pieces ending at the given offsets so none is longer than max_size"""
+    bounded = []
+    for end in ends:
+        while end - start > max_size:
+            space = text.rfind(' ', start + 1, start + max_size)
+            cut = space + 1 if space > start else start + max_size
+            bounded.append(cut)
+            start = cut
+        bounded.append(end)
+        start = end
+    return bounded
+
+
+class ExtractionCache:
+    """Disk-backed cache of extraction results keyed by file and chunk content hashes"""
+
+    def __init__(self, path: str = None, max_entries: int = None):
+        self.path = path or os.getenv('EXTRACTION_CACHE_PATH', 'data/extraction_cache.db')
+        self.max_entries = int(max_entries if max_entries is not None
+                               else os.getenv('EXTRACTION_CACHE_MAX_ENTRIES', 100000))
+        self.stats = {'file_hits': 0, 'file_misses': 0, 'chunk_hits': 0, 'chunk_misses': 0}
+        self.lock = threading.Lock()
+        self.connect()
+
+    def connect(self):
+        """Open the SQLite database and create the schema"""
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        """Close the database connection"""
+        with self.lock:
+            self.conn.close()
+
+    def get_file(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Get the cached result for a file's content hash"""
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT result FROM files WHERE hash = ?", (content_hash,)).fetchone()
+            if row is None:
+                self.stats['file_misses'] += 1
+                return None
+            self.stats['file_hits'] += 1
+            self.conn.execute("UPDATE files SET last_used = ? WHERE hash = ?",
+                              (datetime.now().isoformat(), content_hash))
+        return json.loads(row[0])
+
+    def put_file(self, content_hash: str, result: Dict[str, Any]):
+        """Cache the result for a file's content hash"""
+        now = datetime.now().isoformat()
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO files (hash, result, created_at, last_used) "
+                              "VALUES (?, ?, ?, ?)", (content_hash, json.dumps(result), now, now))
+            self.prune('files')
+
+    def get_chunks(self, hashes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get the cached results for the chunk hashes that are present"""
+        found = {}
+        with self.lock, self.conn:
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self.conn.execute(f"SELECT hash, result FROM chunks WHERE hash IN ({placeholders})",
+                                         batch).fetchall()
+                found.update((chunk_hash, json.loads(result)) for chunk_hash, result in rows)
+                self.conn.execute(f"UPDATE chunks SET last_used = ? WHERE hash IN ({placeholders})",
+                                  [datetime.now().isoformat()] + batch)
+
+            self.stats['chunk_hits'] += len(found)
+            self.stats['chunk_misses'] += len(set(hashes)) - len(found)
+        return found
+
+    def put_chunks(self, results: Dict[str, Dict[str, Any]]):
+        """Cache the results of several chunks"""
+        now = datetime.now().isoformat()
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO chunks (hash, result, last_used) VALUES (?, ?, ?)",
+                                  [(chunk_hash, json.dumps(result), now) for chunk_hash, result in results.items()])
+            self.prune('chunks')
+
+    def prune(self, table: str):
+        """Drop the least recently used entries beyond the size limit"""
+        count = self.conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self.conn.execute(f"DELETE FROM {table} WHERE hash IN "
+                              f"(SELECT hash FROM {table} ORDER BY last_used LIMIT ?)", (excess,))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache sizes and hit counts"""
+        with self.lock:
+            files = self.conn.execute("SELECT count(*) FROM files").fetchone()[0]
+            chunks = self.conn.execute("SELECT count(*) FROM chunks").fetchone()[0]
+            return {'files': files, 'chunks': chunks, **self.stats}
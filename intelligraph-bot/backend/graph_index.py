@@ -0,0 +1,244 @@
+import os
+import time
+import logging
+import threading
+from typing import List, Dict, Any, Iterable, Tuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class GraphIndex:
+    """In-memory adjacency index over Entity/RELATES for fast path queries"""
+
+    def __init__(self, ttl: int = None, max_fanout: int = None):
+        self.ttl = int(ttl if ttl is not None else os.getenv('GRAPH_INDEX_TTL', 300))
+        self.max_fanout = int(max_fanout if max_fanout is not None
+                              else os.getenv('GRAPH_INDEX_MAX_FANOUT', 200))
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        """Drop all indexed nodes and edges"""
+        with self.lock:
+            self.names = []          # node id -> entity name
+            self.ids = {}            # lowercased name -> node id
+            self.adjacency = []      # node id -> list of (neighbor id, rel type id, outgoing)
+            self.rel_types = []      # rel type id -> relationship type
+            self.rel_type_ids = {}
+            self.edge_count = 0
+            self.built_at = None
+
+    def is_stale(self) -> bool:
+        """Check whether the index needs to be (re)built"""
+        return self.built_at is None or time.time() - self.built_at > self.ttl
+
+    def build(self, edges: Iterable[Tuple[str, Optional[str], Optional[str]]]):
+        """Rebuild the index from (source, target, type) rows; a None target adds a lone node"""
+        # Build off to the side so readers keep using the old index while rows stream in
+        fresh = GraphIndex(ttl=self.ttl, max_fanout=self.max_fanout)
+        for source, target, rel_type in edges:
+            if target is None:
+                fresh.add_node(source)
+            else:
+                fresh.add_edge(source, target, rel_type)
+
+        with self.lock:
+            self.names = fresh.names
+            self.ids = fresh.ids
+            self.adjacency = fresh.adjacency
+            self.rel_types = fresh.rel_types
+            self.rel_type_ids = fresh.rel_type_ids
+            self.edge_count = fresh.edge_count
+            self.built_at = time.time()
+        logger.info(f"Graph index built: {len(self.names)} nodes, {self.edge_count} edges")
+
+    def add_node(self, name: str) -> Optional[int]:
+        """Add a node if it is not already indexed and return its id"""
+        if not name:
+            return None
+        key = name.lower()
+        with self.lock:
+            node_id = self.ids.get(key)
+            if node_id is None:
+                node_id = len(self.names)
+                self.ids[key] = node_id
+                self.names.append(name)
+                self.adjacency.append([])
+            return node_id
+
+    def add_edge(self, source: str, target: str, rel_type: str):
+        """Add a directed edge, indexed in both directions for traversal"""
+        with self.lock:
+            source_id = self.add_node(source)
+            target_id = self.add_node(target)
+            if source_id is None or target_id is None or source_id == target_id:
+                return
+
+            type_id = self.rel_type_ids.get(rel_type)
+            if type_id is None:
+                type_id = len(self.rel_types)
+                self.rel_type_ids[rel_type] = type_id
+                self.rel_types.append(rel_type)
+
+            self.adjacency[source_id].append((target_id, type_id, True))
+            self.adjacency[target_id].append((source_id, type_id, False))
+            self.edge_count += 1
+
+    def neighbors(self, node_id: int) -> List[Tuple[int, int, bool]]:
+        """Get the neighbors of a node, truncated to the fan-out limit"""
+        return self.adjacency[node_id][:self.max_fanout]
+
+    def shortest_path_length(self, source_id: int, target_id: int, max_depth: int) -> Optional[int]:
+        """Find the shortest path length with bidirectional BFS"""
+        if source_id == target_id:
+            return 0
+
+        forward = {source_id: 0}
+        backward = {target_id: 0}
+        forward_frontier = [source_id]
+        backward_frontier = [target_id]
+        forward_depth = backward_depth = 0
+
+        while forward_frontier and backward_frontier and forward_depth + backward_depth < max_depth:
+            # Expand the smaller frontier first
+            if len(forward_frontier) <= len(backward_frontier):
+                frontier, visited, other = forward_frontier, forward, backward
+                forward_depth += 1
+                depth = forward_depth
+            else:
+                frontier, visited, other = backward_frontier, backward, forward
+                backward_depth += 1
+                depth = backward_depth
+
+            best = None
+            next_frontier = []
+            for node_id in frontier:
+                for neighbor_id, _, _ in self.neighbors(node_id):
+                    if neighbor_id in visited:
+                        continue
+                    visited[neighbor_id] = depth
+                    if neighbor_id in other:
+                        length = depth + other[neighbor_id]
+                        best = length if best is None else min(best, length)
+                    next_frontier.append(neighbor_id)
+
+            if best is not None:
+                return best
+
+            if visited is forward:
+                forward_frontier = next_frontier
+            else:
+                backward_frontier = next_frontier
+
+        return None
+
+    def distances_to(self, target_id: int, max_depth: int, allowed=None) -> Dict[int, int]:
+        """BFS distances to a target, bounded by depth, fan-out and an optional node set"""
+        distances = {target_id: 0}
+        frontier = [target_id]
+        for depth in range(1, max_depth + 1):
+            next_frontier = []
+            for node_id in frontier:
+                for neighbor_id, _, _ in self.neighbors(node_id):
+                    if allowed is not None and neighbor_id not in allowed:
+                        continue
+                    if neighbor_id not in distances:
+                        distances[neighbor_id] = depth
+                        next_frontier.append(neighbor_id)
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        return distances
+
+    def find_paths(self, source: str, target: str, k: int = 3, max_depth: int = 4) -> Dict[str, Any]:
+        """Find the shortest path and up to k connecting paths between two entities"""
+        with self.lock:
+            source_id = self.ids.get(source.lower())
+            target_id = self.ids.get(target.lower())
+
+            if source_id is None or target_id is None:
+                return {
+                    'source': source,
+                    'target': target,
+                    'found': False,
+                    'missing': [name for name, node_id in ((source, source_id), (target, target_id))
+                                if node_id is None],
+                    'paths': []
+                }
+
+            shortest = self.shortest_path_length(source_id, target_id, max_depth)
+            paths = []
+
+            if shortest is not None:
+                # Every path of at most max_depth hops has its first half inside the source
+                # ball and its second half inside the target ball, so distances measured
+                # within their union prune the search without losing any path.
+                forward_depth = (max_depth + 1) // 2
+                allowed = set(self.distances_to(source_id, forward_depth))
+                allowed.update(self.distances_to(target_id, max_depth - forward_depth))
+                distances = self.distances_to(target_id, max_depth, allowed)
+
+                for length in range(shortest, max_depth + 1):
+                    self.collect_paths(source_id, target_id, length, distances, k, paths)
+                    if len(paths) >= k:
+                        break
+
+            return {
+                'source': self.names[source_id],
+                'target': self.names[target_id],
+                'found': bool(paths),
+                'shortest_length': shortest,
+                'paths': [self.format_path(source_id, path) for path in paths]
+            }
+
+    def collect_paths(self, source_id: int, target_id: int, length: int,
+                      distances: Dict[int, int], k: int, paths: List[List[Tuple[int, int, bool]]]):
+        """Collect simple paths of exactly the given length, pruned by distance to target"""
+        stack = [(source_id, [], {source_id})]
+
+        while stack and len(paths) < k:
+            node_id, steps, visited = stack.pop()
+            remaining = length - len(steps)
+
+            if node_id == target_id:
+                if remaining == 0:
+                    paths.append(steps)
+                continue
+            if remaining <= 0:
+                continue
+
+            for neighbor_id, type_id, outgoing in reversed(self.neighbors(node_id)):
+                if neighbor_id in visited:
+                    continue
+                distance = distances.get(neighbor_id)
+                if distance is None or distance > remaining - 1:
+                    continue
+                stack.append((neighbor_id, steps + [(node_id, neighbor_id, type_id, outgoing)],
+                              visited | {neighbor_id}))
+
+    def format_path(self, source_id: int, steps) -> Dict[str, Any]:
+        """Convert an internal path into names and relationships"""
+        nodes = [self.names[source_id]]
+        relationships = []
+        for start_id, end_id, type_id, outgoing in steps:
+            nodes.append(self.names[end_id])
+            relationships.append({
+                'source': self.names[start_id] if outgoing else self.names[end_id],
+                'target': self.names[end_id] if outgoing else self.names[start_id],
+                'type': self.rel_types[type_id]
+            })
+        return {
+            'length': len(steps),
+            'nodes': nodes,
+            'relationships': relationships
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get index size and freshness"""
+        with self.lock:
+            return {
+                'nodes': len(self.names),
+                'edges': self.edge_count,
+                'built_at': self.built_at,
+                'stale': self.is_stale()
+            }
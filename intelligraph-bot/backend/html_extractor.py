@@ -0,0 +1,84 @@
+from html.parser import HTMLParser
+from typing import Iterator, List
+from upload_stream import iter_decoded
+
+# Elements whose content is never text
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg'}
+
+# Elements that end a paragraph-level block (separated by a blank line, the boundary chunking prefers)
+PARAGRAPH_TAGS = {
+    'p', 'div', 'section', 'article', 'aside', 'header', 'footer', 'main', 'nav',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote', 'pre', 'table', 'ul', 'ol',
+    'dl', 'figure', 'figcaption', 'form', 'fieldset', 'title', 'body', 'hr'
+}
+
+# Elements that only end a line
+LINE_TAGS = {'br', 'li', 'tr', 'dt', 'dd', 'caption', 'option'}
+
+
+class HTMLTextExtractor(HTMLParser):
+    """Event-driven HTML to text conversion that emits one block of text at a time"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.skip_depth = 0
+        self.parts = []
+        self.separator = ''
+        self.started = False
+        self.ready = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        else:
+            self.boundary(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.boundary(tag)
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip_depth = max(self.skip_depth - 1, 0)
+        else:
+            self.boundary(tag)
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(data)
+
+    def boundary(self, tag: str):
+        """End the current block at a block-level tag"""
+        if tag in PARAGRAPH_TAGS:
+            self.flush('\n\n')
+        elif tag in LINE_TAGS:
+            self.flush('\n')
+
+    def flush(self, separator: str = ''):
+        """Emit the buffered block with whitespace collapsed, remembering the strongest separator"""
+        text = ' '.join(''.join(self.parts).split())
+        self.parts = []
+        if text:
+            self.ready.append(self.separator + text if self.started else text)
+            self.started = True
+            self.separator = ''
+        if len(separator) > len(self.separator):
+            self.separator = separator
+
+    def take(self) -> List[str]:
+        """Get the blocks completed so far"""
+        ready, self.ready = self.ready, []
+        return ready
+
+    def iter_text(self, source) -> Iterator[str]:
+        """Yield the text of an HTML file (path or file object) block by block"""
+        for piece in iter_decoded(source):
+            self.feed(piece)
+            yield from self.take()
+        self.close()
+        self.flush()
+        yield from self.take()
+
+
+def extract_html_text(source) -> str:
+    """Extract the visible text of an HTML file with block boundaries as line breaks"""
+    return ''.join(HTMLTextExtractor().iter_text(source))
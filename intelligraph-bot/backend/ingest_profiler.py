@@ -0,0 +1,160 @@
+import os
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Any
+
+# tracemalloc is process-wide, so profiles share it: it runs while any profile tracks
+# memory, and a stage reports a peak only if no other profile was active during it
+tracing_lock = threading.Lock()
+tracing_state = {'profiles': 0, 'entered': 0, 'started': False}
+
+
+class IngestProfile:
+    """Per-stage wall time, CPU time, peak memory and item counts for one document.
+
+    Peak memory is left out of stages that overlapped another memory-tracking profile,
+    since tracemalloc cannot tell their allocations apart.
+    """
+
+    def __init__(self, track_memory: bool = None):
+        # Peak memory comes from tracemalloc, which slows allocation-heavy stages down
+        self.track_memory = (track_memory if track_memory is not None
+                             else os.getenv('INGEST_PROFILE_MEMORY', 'false').lower() == 'true')
+        self.stages = {}
+        self.started = time.perf_counter()
+        self.tracing = False
+
+    def __enter__(self):
+        if self.track_memory:
+            with tracing_lock:
+                if tracing_state['profiles'] == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    tracing_state['started'] = True
+                tracing_state['profiles'] += 1
+                tracing_state['entered'] += 1
+                self.tracing = True
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.tracing:
+            with tracing_lock:
+                tracing_state['profiles'] -= 1
+                if tracing_state['profiles'] == 0 and tracing_state['started']:
+                    tracemalloc.stop()
+                    tracing_state['started'] = False
+                self.tracing = False
+
+    def measure_start(self):
+        """Reset the peak for a stage if this is the only profile tracking memory"""
+        with tracing_lock:
+            if not self.tracing or tracing_state['profiles'] != 1:
+                return None
+            tracemalloc.reset_peak()
+            return tracing_state['entered'], tracemalloc.get_traced_memory()[0]
+
+    def measure_end(self, measurement) -> float:
+        """Get a stage's peak in MB, or None if another profile started meanwhile"""
+        with tracing_lock:
+            entered, start_memory = measurement
+            if tracing_state['profiles'] != 1 or tracing_state['entered'] != entered:
+                return None
+            return max(tracemalloc.get_traced_memory()[1] - start_memory, 0) / 1e6
+
+    @contextmanager
+    def stage(self, name: str, **items):
+        """Measure a stage; the yielded dict collects item counts (stages must not nest)"""
+        start_wall = time.perf_counter()
+        # Thread CPU time, so concurrent requests are not counted (work in pools is not either)
+        start_cpu = time.thread_time()
+        measurement = self.measure_start() if self.tracing else None
+
+        try:
+            yield items
+        finally:
+            stage = self.stages.setdefault(name, {'wall_ms': 0.0, 'cpu_ms': 0.0, 'items': {}})
+            stage['wall_ms'] += (time.perf_counter() - start_wall) * 1000
+            stage['cpu_ms'] += (time.thread_time() - start_cpu) * 1000
+            peak_mb = self.measure_end(measurement) if measurement else None
+            if peak_mb is not None:
+                stage['peak_mb'] = max(stage.get('peak_mb', 0.0), peak_mb)
+            for item, count in items.items():
+                stage['items'][item] = stage['items'].get(item, 0) + count
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the profile with times rounded"""
+        stages = {}
+        for name, stage in self.stages.items():
+            stages[name] = {
+                **stage,
+                'wall_ms': round(stage['wall_ms'], 2),
+                'cpu_ms': round(stage['cpu_ms'], 2)
+            }
+            if 'peak_mb' in stage:
+                stages[name]['peak_mb'] = round(stage['peak_mb'], 2)
+
+        return {
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'stages': stages
+        }
+
+
+class IngestMetrics:
+    """Aggregate ingestion profiles per stage across documents"""
+
+    def __init__(self):
+        self.stage_stats = {}
+        self.documents = 0
+        self.total_ms = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, profile: IngestProfile):
+        """Fold one document's profile into the aggregates"""
+        report = profile.to_dict()
+        with self.lock:
+            self.documents += 1
+            self.total_ms += report['total_ms']
+            for name, stage in report['stages'].items():
+                stats = self.stage_stats.setdefault(name, {
+                    'calls': 0,
+                    'total_wall_ms': 0.0,
+                    'max_wall_ms': 0.0,
+                    'total_cpu_ms': 0.0,
+                    'max_peak_mb': 0.0,
+                    'items': {}
+                })
+                stats['calls'] += 1
+                stats['total_wall_ms'] += stage['wall_ms']
+                stats['max_wall_ms'] = max(stats['max_wall_ms'], stage['wall_ms'])
+                stats['total_cpu_ms'] += stage['cpu_ms']
+                stats['max_peak_mb'] = max(stats['max_peak_mb'], stage.get('peak_mb', 0.0))
+                for item, count in stage['items'].items():
+                    stats['items'][item] = stats['items'].get(item, 0) + count
+
+    def get_report(self) -> Dict[str, Any]:
+        """Get per-stage totals, averages and each stage's share of ingestion time"""
+        with self.lock:
+            stages = {}
+            for name, stats in self.stage_stats.items():
+                stages[name] = {
+                    **stats,
+                    'total_wall_ms': round(stats['total_wall_ms'], 2),
+                    'max_wall_ms': round(stats['max_wall_ms'], 2),
+                    'total_cpu_ms': round(stats['total_cpu_ms'], 2),
+                    'avg_wall_ms': round(stats['total_wall_ms'] / stats['calls'], 2),
+                    'share': round(stats['total_wall_ms'] / self.total_ms, 4) if self.total_ms else 0.0
+                }
+
+            return {
+                'documents': self.documents,
+                'total_ms': round(self.total_ms, 2),
+                'stages': stages
+            }
+
+    def reset(self):
+        """Clear the aggregates"""
+        with self.lock:
+            self.stage_stats.clear()
+            self.documents = 0
+            self.total_ms = 0.0
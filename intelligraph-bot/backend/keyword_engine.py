@@ -0,0 +1,174 @@
+import os
+import math
+import sqlite3
+import threading
+from typing import List, Dict, Any, Iterable, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS keyword_df (
+    term TEXT PRIMARY KEY,
+    df INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS keyword_stats (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO keyword_stats (key, value) VALUES ('documents', 0);
+CREATE TABLE IF NOT EXISTS keyword_document_terms (
+    document TEXT NOT NULL,
+    term TEXT NOT NULL,
+    PRIMARY KEY (document, term)
+) WITHOUT ROWID;
+"""
+
+
+class KeywordEngine:
+    """TF-IDF keyword scoring backed by a persistent, incrementally updated document-frequency table"""
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv('KEYWORD_STATS_PATH', 'data/keywords.db')
+        self.lock = threading.Lock()
+        self.connect()
+
+    def connect(self):
+        """Open the SQLite database and create the schema"""
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        """Close the database connection"""
+        with self.lock:
+            self.conn.close()
+
+    def count_terms(self, doc, owned=None) -> Tuple[Dict[str, Dict[str, Any]], int]:
+        """Count candidate words and noun phrases of a spaCy doc in one pass"""
+        candidates = {}
+        total = 0
+
+        def in_span(start_char):
+            return not owned or owned[0] <= start_char < owned[1]
+
+        for token in doc:
+            if token.is_punct or token.is_space or not in_span(token.idx):
+                continue
+            total += 1
+            if token.pos_ in ("NOUN", "PROPN", "ADJ") and not token.is_stop and len(token.text) > 2:
+                self.add_candidate(candidates, token.text, token.pos_)
+
+        for chunk in doc.noun_chunks:
+            if len(chunk.text.split()) <= 3 and in_span(chunk.start_char):  # Limit to 3 words
+                self.add_candidate(candidates, chunk.text, 'noun_phrase')
+
+        return candidates, total
+
+    def count_words(self, words: Iterable[str]) -> Tuple[Dict[str, Dict[str, Any]], int]:
+        """Count candidate words from plain whitespace-split text"""
+        candidates = {}
+        total = 0
+        for word in words:
+            total += 1
+            if len(word) > 3 and word.isalpha():
+                self.add_candidate(candidates, word.lower(), 'WORD')
+        return candidates, total
+
+    def add_candidate(self, candidates: Dict[str, Dict[str, Any]], text: str, term_type: str):
+        """Add one occurrence of a term, keeping the first surface form seen"""
+        key = text.lower()
+        candidate = candidates.get(key)
+        if candidate is None:
+            candidates[key] = {'text': text, 'type': term_type, 'count': 1}
+        else:
+            candidate['count'] += 1
+
+    def merge_counts(self, target: Dict[str, Dict[str, Any]], counts: Dict[str, Dict[str, Any]]):
+        """Merge the candidate counts of one part of a document into another"""
+        for key, candidate in counts.items():
+            if key in target:
+                target[key]['count'] += candidate['count']
+            else:
+                target[key] = dict(candidate)
+
+    def score(self, candidates: Dict[str, Dict[str, Any]], total: int, document: str = None,
+              limit: int = 50) -> List[Dict[str, Any]]:
+        """Score a document's terms by TF-IDF against the corpus.
+
+        Pass the stored document's key to record its terms first; ad-hoc text is scored
+        without touching the corpus statistics.
+        """
+        if not candidates:
+            return []
+
+        with self.lock:
+            if document is not None:
+                self.record_document(document, candidates.keys())
+            documents, frequencies = self.get_frequencies(list(candidates.keys()))
+
+        keywords = []
+        for key, candidate in candidates.items():
+            df = frequencies.get(key, 0)
+            # Sublinear term frequency and smoothed inverse document frequency
+            tf = 1 + math.log(candidate['count'])
+            idf = math.log((1 + documents) / (1 + df)) + 1
+            keywords.append({
+                'text': candidate['text'],
+                'type': candidate['type'],
+                'importance': round(tf * idf / max(math.log(1 + total), 1.0), 4),
+                'count': candidate['count'],
+                'df': df
+            })
+
+        keywords.sort(key=lambda x: x['importance'], reverse=True)
+        return keywords[:limit]
+
+    def record_document(self, document: str, terms: Iterable[str]):
+        """Count a stored document's distinct terms in the corpus statistics.
+
+        A document recorded before (a new version) only moves the frequencies of the terms
+        it gained or lost, and is not counted as another document.
+        """
+        terms = set(terms)
+        with self.conn:
+            previous = {term for (term,) in self.conn.execute(
+                "SELECT term FROM keyword_document_terms WHERE document = ?", (document,))}
+            added, removed = terms - previous, previous - terms
+
+            self.conn.executemany(
+                "INSERT INTO keyword_df (term, df) VALUES (?, 1) "
+                "ON CONFLICT(term) DO UPDATE SET df = df + 1",
+                ((term,) for term in added)
+            )
+            self.conn.executemany("UPDATE keyword_df SET df = df - 1 WHERE term = ?", ((term,) for term in removed))
+            self.conn.executemany("INSERT INTO keyword_document_terms (document, term) VALUES (?, ?)",
+                                  ((document, term) for term in added))
+            self.conn.executemany("DELETE FROM keyword_document_terms WHERE document = ? AND term = ?",
+                                  ((document, term) for term in removed))
+            if not previous:
+                self.conn.execute("UPDATE keyword_stats SET value = value + 1 WHERE key = 'documents'")
+
+    def get_frequencies(self, terms: List[str]) -> Tuple[int, Dict[str, int]]:
+        """Get the corpus document count and the document frequency of each term"""
+        documents = self.conn.execute(
+            "SELECT value FROM keyword_stats WHERE key = 'documents'").fetchone()[0]
+
+        frequencies = {}
+        for start in range(0, len(terms), 500):
+            batch = terms[start:start + 500]
+            frequencies.update(self.conn.execute(
+                f"SELECT term, df FROM keyword_df WHERE term IN ({','.join('?' * len(batch))})",
+                batch
+            ).fetchall())
+
+        return documents, frequencies
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get corpus size and vocabulary size"""
+        with self.lock:
+            documents = self.conn.execute(
+                "SELECT value FROM keyword_stats WHERE key = 'documents'").fetchone()[0]
+            terms = self.conn.execute("SELECT count(*) FROM keyword_df").fetchone()[0]
+        return {'documents': documents, 'terms': terms}
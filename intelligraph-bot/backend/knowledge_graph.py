@@ -2,12 +2,24 @@ from neo4j import GraphDatabase
 import logging
 from typing import List, Dict, Any
 import json
+import threading
+from query_profiler import QueryProfiler
+from graph_index import GraphIndex
+from autocomplete import SuggestionIndex
+from change_log import ChangeLog
+from ingest_profiler import IngestProfile
 
 logger = logging.getLogger(__name__)
 
 class KnowledgeGraph:
     def __init__(self):
         self.driver = None
+        self.profiler = QueryProfiler()
+        self.graph_index = GraphIndex()
+        self.graph_index_refresh = threading.Lock()
+        self.suggestions = SuggestionIndex()
+        self.suggestions_refresh = threading.Lock()
+        self.change_log = ChangeLog()
         self.connect()
     
     def connect(self):
@@ -19,6 +31,7 @@ class KnowledgeGraph:
             password = os.getenv('NEO4J_PASSWORD', 'demo')
             
             self.driver = GraphDatabase.driver(uri, auth=(user, password))
+            self.profiler.attach(self.driver)
             logger.info("Connected to Neo4j database")
         except Exception as e:
             logger.error(f"Failed to connect to Neo4j: {e}")
@@ -29,21 +42,38 @@ class KnowledgeGraph:
 
     def create_node(self, label: str, properties: Dict[str, Any]):
         """Create a node in the knowledge graph"""
-        query = f"CREATE (n:{label} {{props}}) RETURN n"
+        query = f"CREATE (n:{label} $props) RETURN n, id(n) as id"
         with self.driver.session() as session:
             result = session.run(query, props=properties)
-            return result.single()
+            record = result.single()
+            if record:
+                self.change_log.record('node', 'added', record['id'], {
+                    'id': record['id'],
+                    'name': properties.get('name'),
+                    'type': properties.get('type'),
+                    'description': properties.get('description')
+                })
+            return record
 
     def create_relationship(self, start_node_id: int, end_node_id: int, rel_type: str):
         """Create a relationship between two nodes"""
         query = (
             "MATCH (a), (b) "
             "WHERE id(a) = $start_node_id AND id(b) = $end_node_id "
-            "CREATE (a)-[r:" + rel_type + "]->(b) RETURN r"
+            "CREATE (a)-[r:" + rel_type + "]->(b) RETURN r, id(r) as id"
         )
         with self.driver.session() as session:
             result = session.run(query, start_node_id=start_node_id, end_node_id=end_node_id)
-            return result.single()
+            record = result.single()
+            if record:
+                self.change_log.record('edge', 'added', record['id'], {
+                    'id': record['id'],
+                    'source': start_node_id,
+                    'target': end_node_id,
+                    'relationship': rel_type,
+                    'properties': None
+                })
+            return record
 
     def search_knowledge(self, query: str) -> List[Dict[str, Any]]:
         """Search knowledge graph for relevant information"""
@@ -59,7 +89,7 @@ class KnowledgeGraph:
                 LIMIT 10
                 """
                 
-                result = session.run(cypher_query, query=query)
+                result = self.profiler.run(session, 'search_knowledge', cypher_query, query=query)
                 
                 results = []
                 for record in result:
@@ -79,6 +109,9 @@ class KnowledgeGraph:
     def get_graph_data(self) -> Dict[str, Any]:
         """Get graph data for visualization"""
         try:
+            # Taken before reading so changes made during the read are replayed by the next sync
+            version = self.change_log.current_version()
+            
             with self.driver.session() as session:
                 # Get nodes
                 nodes_query = """
@@ -88,7 +121,7 @@ class KnowledgeGraph:
                 LIMIT 100
                 """
                 
-                nodes_result = session.run(nodes_query)
+                nodes_result = self.profiler.run(session, 'get_graph_data.nodes', nodes_query)
                 nodes = []
                 for record in nodes_result:
                     nodes.append({
@@ -101,15 +134,16 @@ class KnowledgeGraph:
                 # Get relationships
                 edges_query = """
                 MATCH (a)-[r]->(b)
-                RETURN id(a) as source, id(b) as target, 
+                RETURN id(r) as id, id(a) as source, id(b) as target, 
                        type(r) as relationship, r.properties as properties
                 LIMIT 200
                 """
                 
-                edges_result = session.run(edges_query)
+                edges_result = self.profiler.run(session, 'get_graph_data.edges', edges_query)
                 edges = []
                 for record in edges_result:
                     edges.append({
+                        'id': record['id'],
                         'source': record['source'],
                         'target': record['target'],
                         'relationship': record['relationship'],
@@ -119,6 +153,7 @@ class KnowledgeGraph:
                 return {
                     'nodes': nodes,
                     'edges': edges,
+                    'version': version,
                     'stats': {
                         'node_count': len(nodes),
                         'edge_count': len(edges)
@@ -129,7 +164,8 @@ class KnowledgeGraph:
             logger.error(f"Graph data retrieval error: {str(e)}")
             return {'nodes': [], 'edges': [], 'stats': {}}
     
-    def add_entity(self, name: str, entity_type: str, description: str, properties: Dict = None):
+    def add_entity(self, name: str, entity_type: str, description: str, properties: Dict = None,
+                   aliases: List[str] = None):
         """Add a new entity to the knowledge graph"""
         try:
             with self.driver.session() as session:
@@ -139,16 +175,31 @@ class KnowledgeGraph:
                     type: $type,
                     description: $description,
                     properties: $properties,
+                    aliases: $aliases,
                     created_at: datetime()
                 })
-                RETURN n
+                RETURN id(n) as id
                 """
                 
-                session.run(query, 
+                records = self.profiler.run(session, 'add_entity', query,
                           name=name, 
                           type=entity_type, 
                           description=description, 
-                          properties=properties or {})
+                          properties=properties or {},
+                          aliases=aliases or [])
+                
+                for record in records:
+                    self.change_log.record('node', 'added', record['id'], {
+                        'id': record['id'],
+                        'name': name,
+                        'type': entity_type,
+                        'description': description
+                    })
+                
+                if not self.graph_index.is_stale():
+                    self.graph_index.add_node(name)
+                if not self.suggestions.is_stale():
+                    self.suggestions.add(name, aliases or [])
                 
                 logger.info(f"Added entity: {name}")
                 
@@ -166,43 +217,286 @@ class KnowledgeGraph:
                     properties: $properties,
                     created_at: datetime()
                 }]->(b)
-                RETURN r
+                RETURN id(r) as id, id(a) as source, id(b) as target,
+                       type(r) as relationship, r.properties as properties
                 """
                 
-                session.run(query,
+                records = self.profiler.run(session, 'add_relationship', query,
                           entity1=entity1,
                           entity2=entity2,
                           relationship_type=relationship_type,
                           properties=properties or {})
                 
+                index_fresh = not self.graph_index.is_stale()
+                for record in records:
+                    self.change_log.record('edge', 'added', record['id'], {
+                        'id': record['id'],
+                        'source': record['source'],
+                        'target': record['target'],
+                        'relationship': record['relationship'],
+                        'properties': record['properties']
+                    })
+                    # Only edges Neo4j created, so a missing endpoint adds nothing to the index
+                    if index_fresh:
+                        self.graph_index.add_edge(entity1, entity2, relationship_type)
+                
+                if not records:
+                    logger.warning(f"No relationship added: {entity1} or {entity2} not found")
+                    return
                 logger.info(f"Added relationship: {entity1} -> {entity2}")
                 
         except Exception as e:
             logger.error(f"Failed to add relationship: {str(e)}")
     
-    def update_from_document(self, document_data: Dict):
-        """Update knowledge graph from processed document"""
+    def add_entities(self, entities: List[Dict[str, Any]]) -> bool:
+        """Add many entities in a single write, returning whether it was committed"""
+        if not entities:
+            return True
+        try:
+            rows = [{
+                'name': entity['name'],
+                'type': entity['type'],
+                'description': entity.get('description') or '',
+                'properties': entity.get('properties', {}),
+                'aliases': entity.get('aliases', []),
+                'document': entity.get('document')
+            } for entity in entities]
+
+            with self.driver.session() as session:
+                query = """
+                UNWIND $rows AS row
+                CREATE (n:Entity {
+                    name: row.name,
+                    type: row.type,
+                    description: row.description,
+                    properties: row.properties,
+                    aliases: row.aliases,
+                    document: row.document,
+                    created_at: datetime()
+                })
+                RETURN id(n) as id, row.name as name, row.type as type,
+                       row.description as description, row.aliases as aliases
+                """
+
+                records = self.profiler.run(session, 'add_entities', query, rows=rows)
+
+                index_fresh = not self.graph_index.is_stale()
+                suggestions_fresh = not self.suggestions.is_stale()
+                for record in records:
+                    self.change_log.record('node', 'added', record['id'], {
+                        'id': record['id'],
+                        'name': record['name'],
+                        'type': record['type'],
+                        'description': record['description']
+                    })
+                    if index_fresh:
+                        self.graph_index.add_node(record['name'])
+                    if suggestions_fresh:
+                        self.suggestions.add(record['name'], record['aliases'] or [])
+
+                logger.info(f"Added {len(records)} entities")
+                return True
+
+        except Exception as e:
+            logger.error(f"Failed to add entities: {str(e)}")
+            return False
+
+    def add_relationships(self, relations: List[Dict[str, Any]]) -> bool:
+        """Add many relationships in a single write, returning whether it was committed"""
+        if not relations:
+            return True
+        try:
+            rows = [{
+                'source': relation['source'],
+                'target': relation['target'],
+                'type': relation['type'],
+                'properties': relation.get('properties', {}),
+                'document': relation.get('document')
+            } for relation in relations]
+
+            with self.driver.session() as session:
+                self.ensure_indexes(session)
+                # Each document has its own entity nodes, so a relationship joins the ones
+                # of its document rather than every node sharing the names
+                query = """
+                UNWIND $rows AS row
+                MATCH (a:Entity {name: row.source}) WHERE row.document IS NULL OR a.document = row.document
+                MATCH (b:Entity {name: row.target}) WHERE row.document IS NULL OR b.document = row.document
+                CREATE (a)-[r:RELATES {
+                    type: row.type,
+                    properties: row.properties,
+                    document: row.document,
+                    created_at: datetime()
+                }]->(b)
+                RETURN id(r) as id, id(a) as source, id(b) as target,
+                       type(r) as relationship, r.properties as properties,
+                       row.source as source_name, row.target as target_name, row.type as type
+                """
+
+                records = self.profiler.run(session, 'add_relationships', query, rows=rows)
+
+                index_fresh = not self.graph_index.is_stale()
+                for record in records:
+                    self.change_log.record('edge', 'added', record['id'], {
+                        'id': record['id'],
+                        'source': record['source'],
+                        'target': record['target'],
+                        'relationship': record['relationship'],
+                        'properties': record['properties']
+                    })
+                    if index_fresh:
+                        self.graph_index.add_edge(record['source_name'], record['target_name'], record['type'])
+
+                logger.info(f"Added {len(records)} relationships")
+                return True
+
+        except Exception as e:
+            logger.error(f"Failed to add relationships: {str(e)}")
+            return False
+
+    def update_from_document(self, document_data: Dict, profile: IngestProfile = None) -> bool:
+        """Update knowledge graph from processed document, returning whether every write committed"""
+        profile = profile or IngestProfile(track_memory=False)
         try:
-            # Add entities from document
-            for entity in document_data.get('entities', []):
-                self.add_entity(
-                    name=entity['name'],
-                    entity_type=entity['type'],
-                    description=entity.get('description', ''),
-                    properties=entity.get('properties', {})
-                )
+            if document_data.get('source'):
+                # Facts carry their source document, so a new version only writes the difference
+                self.sync_document(document_data['source'], document_data.get('entities', []),
+                                   document_data.get('relations', []), profile)
+                return True
             
-            # Add relationships from document
-            for relation in document_data.get('relations', []):
-                self.add_relationship(
-                    entity1=relation['source'],
-                    entity2=relation['target'],
-                    relationship_type=relation['type'],
-                    properties=relation.get('properties', {})
-                )
+            # Add entities, then the relationships between them, one write each
+            with profile.stage('graph_entities') as items:
+                items['entities'] = len(document_data.get('entities', []))
+                written = self.add_entities(document_data.get('entities', []))
+            with profile.stage('graph_relations') as items:
+                items['relations'] = len(document_data.get('relations', []))
+                return written and self.add_relationships(document_data.get('relations', []))
                 
         except Exception as e:
             logger.error(f"Failed to update from document: {str(e)}")
+            return False
+    
+    def ensure_indexes(self, session):
+        """Create the indexes used to match entities by name and find a document's facts (once per process)"""
+        if getattr(self, 'indexes_ready', False):
+            return
+        session.run("CREATE INDEX entity_name IF NOT EXISTS FOR (n:Entity) ON (n.name)").consume()
+        session.run("CREATE INDEX entity_document IF NOT EXISTS FOR (n:Entity) ON (n.document)").consume()
+        session.run("CREATE INDEX relates_document IF NOT EXISTS FOR ()-[r:RELATES]-() ON (r.document)").consume()
+        self.indexes_ready = True
+    
+    def sync_document(self, document: str, entities: List[Dict[str, Any]], relations: List[Dict[str, Any]],
+                      profile: IngestProfile = None) -> Dict[str, int]:
+        """Make a document's facts in the graph match its latest extraction.
+        
+        Only entities and relationships the document no longer yields are retracted, and
+        only ones it did not yield before are written. Raises RuntimeError if a write
+        fails; syncing again picks up whatever was committed.
+        """
+        profile = profile or IngestProfile(track_memory=False)
+        
+        with profile.stage('graph_diff') as items:
+            with self.driver.session() as session:
+                self.ensure_indexes(session)
+                existing_entities = self.profiler.run(session, 'sync_document.entities', """
+                    MATCH (n:Entity {document: $document})
+                    RETURN id(n) as id, n.name as name, n.type as type
+                    """, document=document)
+                existing_relations = self.profiler.run(session, 'sync_document.relations', """
+                    MATCH (a)-[r:RELATES {document: $document}]->(b)
+                    RETURN id(r) as id, a.name as source, b.name as target, r.type as type
+                    """, document=document)
+            
+            entity_keys = {(entity['name'].lower(), entity['type']) for entity in entities}
+            relation_keys = {(relation['source'], relation['target'], relation['type']) for relation in relations}
+            existing_entity_keys = {(record['name'].lower(), record['type']) for record in existing_entities}
+            existing_relation_keys = {(record['source'], record['target'], record['type'])
+                                      for record in existing_relations}
+            
+            stale_nodes = [record['id'] for record in existing_entities
+                           if (record['name'].lower(), record['type']) not in entity_keys]
+            stale_edges = [record['id'] for record in existing_relations
+                           if (record['source'], record['target'], record['type']) not in relation_keys]
+            items.update(existing_entities=len(existing_entities), existing_relations=len(existing_relations))
+        
+        with profile.stage('graph_retract') as items:
+            detached = self.retract_facts(stale_nodes, stale_edges)
+            # Kept relationships that hung off a retracted entity were removed with it
+            existing_relation_keys -= detached
+            items.update(entities=len(stale_nodes), relations=len(stale_edges))
+        
+        new_entities, seen = [], set()
+        for entity in entities:
+            key = (entity['name'].lower(), entity['type'])
+            if key not in existing_entity_keys and key not in seen:
+                seen.add(key)
+                new_entities.append({**entity, 'document': document})
+        new_relations, seen = [], set()
+        for relation in relations:
+            key = (relation['source'], relation['target'], relation['type'])
+            if key not in existing_relation_keys and key not in seen:
+                seen.add(key)
+                new_relations.append({**relation, 'document': document})
+        
+        with profile.stage('graph_entities') as items:
+            items['entities'] = len(new_entities)
+            written = self.add_entities(new_entities)
+        with profile.stage('graph_relations') as items:
+            items['relations'] = len(new_relations)
+            written = written and self.add_relationships(new_relations)
+        if not written:
+            raise RuntimeError(f"Failed to write graph facts for {document}")
+        
+        logger.info(f"Synced {document}: +{len(new_entities)}/-{len(stale_nodes)} entities, "
+                    f"+{len(new_relations)}/-{len(stale_edges)} relationships")
+        return {
+            'entities_added': len(new_entities),
+            'entities_removed': len(stale_nodes),
+            'relations_added': len(new_relations),
+            'relations_removed': len(stale_edges)
+        }
+    
+    def retract_facts(self, node_ids: List[int], edge_ids: List[int]) -> set:
+        """Delete relationships and entities by id, returning the (source, target, type) keys detached with them"""
+        if not node_ids and not edge_ids:
+            return set()
+        
+        removed_edges = set()
+        detached = set()
+        with self.driver.session() as session:
+            if edge_ids:
+                records = self.profiler.run(session, 'retract_facts.relationships', """
+                    UNWIND $ids AS rid
+                    MATCH ()-[r]->() WHERE id(r) = rid
+                    DELETE r
+                    RETURN rid as id
+                    """, ids=edge_ids)
+                removed_edges.update(record['id'] for record in records)
+            
+            if node_ids:
+                records = self.profiler.run(session, 'retract_facts.entities', """
+                    UNWIND $ids AS nid
+                    MATCH (n) WHERE id(n) = nid
+                    OPTIONAL MATCH (n)-[r]-()
+                    WITH n, nid, collect(DISTINCT r) AS rels
+                    WITH n, nid, [r IN rels | {id: id(r), source: startNode(r).name,
+                                               target: endNode(r).name, type: r.type}] AS edges
+                    DETACH DELETE n
+                    RETURN nid as id, edges
+                    """, ids=node_ids)
+                for record in records:
+                    self.change_log.record('node', 'removed', record['id'])
+                    for edge in record['edges']:
+                        removed_edges.add(edge['id'])
+                        detached.add((edge['source'], edge['target'], edge['type']))
+        
+        for edge_id in removed_edges:
+            self.change_log.record('edge', 'removed', edge_id)
+        
+        # The in-memory indexes cannot remove items, so rebuild them on next use
+        self.graph_index.clear()
+        self.suggestions.clear()
+        return detached
     
     def get_stats(self) -> Dict[str, Any]:
         """Get knowledge graph statistics"""
@@ -210,11 +504,11 @@ class KnowledgeGraph:
             with self.driver.session() as session:
                 # Count nodes
                 node_count_query = "MATCH (n) RETURN count(n) as count"
-                node_count = session.run(node_count_query).single()['count']
+                node_count = self.profiler.run(session, 'get_stats.nodes', node_count_query)[0]['count']
                 
                 # Count relationships
                 rel_count_query = "MATCH ()-[r]->() RETURN count(r) as count"
-                rel_count = session.run(rel_count_query).single()['count']
+                rel_count = self.profiler.run(session, 'get_stats.relationships', rel_count_query)[0]['count']
                 
                 # Get entity types
                 types_query = """
@@ -222,7 +516,7 @@ class KnowledgeGraph:
                 RETURN n.type as type, count(n) as count
                 ORDER BY count DESC
                 """
-                types_result = session.run(types_query)
+                types_result = self.profiler.run(session, 'get_stats.types', types_query)
                 entity_types = {record['type']: record['count'] for record in types_result}
                 
                 return {
@@ -235,6 +529,93 @@ class KnowledgeGraph:
             logger.error(f"Failed to get stats: {str(e)}")
             return {}
     
+    def refresh_graph_index(self, force: bool = False):
+        """Rebuild the in-memory adjacency index from Entity/RELATES if it is stale.
+        
+        One request rebuilds at a time. Others keep using the stale index meanwhile, and
+        only wait when there is no index to use yet.
+        """
+        if not force and not self.graph_index.is_stale():
+            return
+        if not self.graph_index_refresh.acquire(blocking=force or self.graph_index.built_at is None):
+            return
+        
+        try:
+            if not force and not self.graph_index.is_stale():
+                # Rebuilt by the request this one waited for
+                return
+            with self.driver.session() as session:
+                # Streamed rather than profiled: this is an intentional full read
+                query = """
+                MATCH (a:Entity)
+                OPTIONAL MATCH (a)-[r:RELATES]->(b:Entity)
+                RETURN a.name as source, b.name as target, r.type as type
+                """
+                edges = ((record['source'], record['target'], record['type'])
+                         for record in session.run(query))
+                self.graph_index.build(edges)
+                
+        except Exception as e:
+            logger.error(f"Graph index refresh error: {str(e)}")
+        finally:
+            self.graph_index_refresh.release()
+    
+    def find_connections(self, source: str, target: str, k: int = 3, max_depth: int = 4) -> Dict[str, Any]:
+        """Find the shortest and top-k connecting paths between two entities"""
+        try:
+            self.refresh_graph_index()
+            return self.graph_index.find_paths(source, target, k=k, max_depth=max_depth)
+            
+        except Exception as e:
+            logger.error(f"Connection search error: {str(e)}")
+            return {'source': source, 'target': target, 'found': False, 'paths': []}
+    
+    def refresh_suggestions(self, force: bool = False):
+        """Rebuild the in-memory entity name suggestion index if it is stale.
+        
+        As with the path index, one request rebuilds while others use the stale index.
+        """
+        if not force and not self.suggestions.is_stale():
+            return
+        if not self.suggestions_refresh.acquire(blocking=force or self.suggestions.built_at is None):
+            return
+        
+        try:
+            if not force and not self.suggestions.is_stale():
+                return
+            with self.driver.session() as session:
+                query = """
+                MATCH (n:Entity)
+                WHERE n.name IS NOT NULL
+                RETURN n.name as name, n.aliases as aliases
+                """
+                entries = ({'name': record['name'], 'aliases': record['aliases']}
+                           for record in session.run(query))
+                self.suggestions.build(entries)
+                
+        except Exception as e:
+            logger.error(f"Suggestion index refresh error: {str(e)}")
+        finally:
+            self.suggestions_refresh.release()
+    
+    def suggest_entities(self, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get ranked entity name completions for a prefix"""
+        try:
+            self.refresh_suggestions()
+            return self.suggestions.suggest(prefix, limit=limit)
+            
+        except Exception as e:
+            logger.error(f"Entity suggestion error: {str(e)}")
+            return []
+    
+    def get_changes(self, since: int) -> Dict[str, Any]:
+        """Get node and edge changes made after a graph version"""
+        return self.change_log.changes_since(since)
+    
+    def get_query_report(self) -> Dict[str, Any]:
+        """Get query latency statistics and captured slow query plans"""
+        return self.profiler.get_report()
+    
     def close(self):
         """Close database connection"""
         if self.driver:
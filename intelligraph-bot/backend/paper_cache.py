@@ -0,0 +1,202 @@
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    abstract TEXT NOT NULL,
+    authors TEXT NOT NULL,
+    record TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+    title, abstract, authors,
+    content='papers', content_rowid='rowid'
+);
+CREATE TABLE IF NOT EXISTS queries (
+    provider TEXT NOT NULL,
+    query TEXT NOT NULL,
+    max_results INTEGER NOT NULL,
+    paper_ids TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (provider, query)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_queries_fetched_at ON queries(fetched_at);
+CREATE TABLE IF NOT EXISTS trends (
+    query TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    stats TEXT NOT NULL,
+    computed_at REAL NOT NULL,
+    PRIMARY KEY (query, year)
+) WITHOUT ROWID;
+"""
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query so trivially different spellings share a cache entry"""
+    return ' '.join(query.lower().split())
+
+
+def paper_id(paper: Dict[str, Any]) -> str:
+    """Get a stable id for a paper record, preferring canonical identifiers"""
+    if paper.get('doi'):
+        return f"doi:{paper['doi'].lower()}"
+    if paper.get('arxiv_id'):
+        return f"arxiv:{paper['arxiv_id']}"
+    title = ' '.join(re.findall(r'\w+', paper.get('title', '').lower()))
+    return 'title:' + hashlib.sha1(title.encode('utf-8')).hexdigest()
+
+
+class PaperCache:
+    """Disk-backed cache of provider result sets and paper records, with a local full-text index.
+
+    A result set is fresh for ttl seconds. After that it can still be served, up to
+    max_stale seconds, while the caller refreshes it in the background.
+    """
+
+    def __init__(self, path: str = None, ttl: float = None, max_stale: float = None):
+        self.path = path or os.getenv('PAPER_CACHE_PATH', 'data/papers.db')
+        self.ttl = float(ttl if ttl is not None else os.getenv('SCHOLARLY_RESULT_TTL', 3600))
+        self.max_stale = float(max_stale if max_stale is not None else os.getenv('PAPER_CACHE_MAX_STALE', 604800))
+        self.stats = {'fresh_hits': 0, 'stale_hits': 0, 'misses': 0}
+        self.lock = threading.Lock()
+        self.connect()
+
+    def connect(self):
+        """Open the SQLite database and create the schema"""
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        """Close the database connection"""
+        with self.lock:
+            self.conn.close()
+
+    def get_results(self, provider: str, query: str, limit: int) -> Optional[Dict[str, Any]]:
+        """Get a provider's cached papers for a query.
+
+        Returns {'papers', 'fresh', 'max_results'}, or None when nothing usable is cached
+        (never fetched, fetched with a smaller limit, or older than max_stale).
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT max_results, paper_ids, fetched_at FROM queries "
+                                    "WHERE provider = ? AND query = ?",
+                                    (provider, normalize_query(query))).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+
+            max_results, paper_ids, fetched_at = row
+            paper_ids = json.loads(paper_ids)
+            age = time.time() - fetched_at
+            # A result set shorter than its limit was exhaustive, so it covers any limit
+            covers = max_results >= limit or len(paper_ids) < max_results
+            if not covers or age > self.max_stale:
+                self.stats['misses'] += 1
+                return None
+
+            papers = self.load_papers(paper_ids[:limit])
+            fresh = age <= self.ttl
+            self.stats['fresh_hits' if fresh else 'stale_hits'] += 1
+        return {'papers': papers, 'fresh': fresh, 'max_results': max_results}
+
+    def load_papers(self, paper_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get paper records by id, in the given order"""
+        records = {}
+        for start in range(0, len(paper_ids), 500):
+            batch = paper_ids[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            rows = self.conn.execute(f"SELECT id, record FROM papers WHERE id IN ({placeholders})", batch)
+            records.update((row_id, json.loads(record)) for row_id, record in rows)
+        return [records[row_id] for row_id in paper_ids if row_id in records]
+
+    def put_results(self, provider: str, query: str, limit: int, papers: List[Dict[str, Any]],
+                    complete: bool = True):
+        """Cache a provider's papers for a query, updating the paper records.
+
+        limit is the most papers the provider could have returned. The papers of an
+        incomplete search (cut short by an error or time limit) are stored for local
+        search, but the result set is not cached, as it would pass for an exhaustive one.
+        """
+        now = time.time()
+        with self.lock, self.conn:
+            paper_ids = [self.upsert_paper(paper, now) for paper in papers]
+            if not complete:
+                return
+            self.conn.execute("INSERT INTO queries (provider, query, max_results, paper_ids, fetched_at) "
+                              "VALUES (?, ?, ?, ?, ?) ON CONFLICT (provider, query) DO UPDATE SET "
+                              "max_results = excluded.max_results, paper_ids = excluded.paper_ids, "
+                              "fetched_at = excluded.fetched_at",
+                              (provider, normalize_query(query), limit, json.dumps(paper_ids), now))
+            self.conn.execute("DELETE FROM queries WHERE fetched_at < ?", (now - self.max_stale,))
+
+    def upsert_paper(self, paper: Dict[str, Any], now: float) -> str:
+        """Store a paper record and keep its full-text entry in sync"""
+        row_id = paper_id(paper)
+        authors = ', '.join(paper.get('authors', []))
+        # External-content FTS needs the old values to remove an entry
+        self.conn.execute("INSERT INTO papers_fts (papers_fts, rowid, title, abstract, authors) "
+                          "SELECT 'delete', rowid, title, abstract, authors FROM papers WHERE id = ?", (row_id,))
+        self.conn.execute("INSERT INTO papers (id, title, abstract, authors, record, updated_at) "
+                          "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET "
+                          "title = excluded.title, abstract = excluded.abstract, authors = excluded.authors, "
+                          "record = excluded.record, updated_at = excluded.updated_at",
+                          (row_id, paper['title'], paper.get('abstract', ''), authors, json.dumps(paper), now))
+        self.conn.execute("INSERT INTO papers_fts (rowid, title, abstract, authors) "
+                          "SELECT rowid, title, abstract, authors FROM papers WHERE id = ?", (row_id,))
+        return row_id
+
+    def get_trends(self, query: str, years: List[int]) -> Optional[Dict[int, Dict[str, Any]]]:
+        """Get fresh per-year trend aggregates for a query, or None unless every year is cached"""
+        placeholders = ','.join('?' * len(years))
+        with self.lock:
+            rows = self.conn.execute(f"SELECT year, stats FROM trends WHERE query = ? AND year IN ({placeholders}) "
+                                     f"AND computed_at >= ?",
+                                     [normalize_query(query), *years, time.time() - self.ttl]).fetchall()
+        if len(rows) < len(years):
+            return None
+        return {year: json.loads(stats) for year, stats in rows}
+
+    def put_trends(self, query: str, trends: Dict[int, Dict[str, Any]]):
+        """Cache per-year trend aggregates for a query"""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO trends (query, year, stats, computed_at) VALUES (?, ?, ?, ?)",
+                                  [(normalize_query(query), year, json.dumps(stats), now)
+                                   for year, stats in trends.items()])
+            self.conn.execute("DELETE FROM trends WHERE computed_at < ?", (now - self.max_stale,))
+
+    def search_local(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Full-text search over every cached paper, titles weighted above abstracts"""
+        terms = re.findall(r'\w+', query.lower())
+        if not terms:
+            return []
+        match = ' OR '.join(f'"{term}"' for term in terms)
+        with self.lock:
+            rows = self.conn.execute("SELECT papers.record FROM papers_fts "
+                                     "JOIN papers ON papers.rowid = papers_fts.rowid "
+                                     "WHERE papers_fts MATCH ? ORDER BY bm25(papers_fts, 3.0, 1.0, 0.5) LIMIT ?",
+                                     (match, limit)).fetchall()
+        return [json.loads(record) for (record,) in rows]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache sizes and hit counts"""
+        with self.lock:
+            papers = self.conn.execute("SELECT count(*) FROM papers").fetchone()[0]
+            queries = self.conn.execute("SELECT count(*) FROM queries").fetchone()[0]
+            return {'papers': papers, 'queries': queries, **self.stats}
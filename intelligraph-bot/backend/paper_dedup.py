@@ -0,0 +1,107 @@
+import os
+import re
+import zlib
+from collections import defaultdict
+from typing import List, Dict, Any, Set
+import numpy as np
+
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+def title_shingles(title: str, size: int = 4) -> Set[int]:
+    """Hash the character n-grams of a title with case, punctuation and spacing normalized away"""
+    text = ' '.join(re.findall(r'\w+', (title or '').lower()))
+    if len(text) <= size:
+        return {zlib.crc32(text.encode('utf-8'))} if text else set()
+    return {zlib.crc32(text[i:i + size].encode('utf-8')) for i in range(len(text) - size + 1)}
+
+
+class PaperDeduplicator:
+    """Merge records of the same paper from different providers.
+
+    Papers sharing a DOI or arXiv id are merged first. The rest are matched on titles,
+    with MinHash signatures banded into LSH buckets so that only papers colliding in
+    some band are compared. That keeps deduplication near-linear in the number of papers.
+    """
+
+    def __init__(self, threshold: float = None, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        self.threshold = float(threshold if threshold is not None else os.getenv('PAPER_DEDUP_THRESHOLD', 0.8))
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, MERSENNE_PRIME, size=(num_perm, 1)).astype(np.uint64)
+        self.b = rng.randint(0, MERSENNE_PRIME, size=(num_perm, 1)).astype(np.uint64)
+
+    def signature(self, shingles: Set[int]) -> np.ndarray:
+        """MinHash signature of a shingle set under num_perm universal hash functions"""
+        hashes = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        # a < 2^31 and hashes < 2^32, so the products fit in 64 bits
+        return ((self.a * hashes + self.b) % MERSENNE_PRIME).min(axis=1)
+
+    def deduplicate(self, papers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Get one merged record per distinct paper, in order of first appearance"""
+        parent = list(range(len(papers)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(i, j):
+            i, j = find(i), find(j)
+            if i != j:
+                parent[max(i, j)] = min(i, j)
+
+        # Canonical identifiers
+        first_seen = {}
+        for index, paper in enumerate(papers):
+            for key in (f"doi:{paper['doi'].lower()}" if paper.get('doi') else None,
+                        f"arxiv:{paper['arxiv_id']}" if paper.get('arxiv_id') else None):
+                if key:
+                    union(index, first_seen.setdefault(key, index))
+
+        # Near-identical titles through LSH candidate pairs, confirmed by exact Jaccard
+        shingles = [title_shingles(paper.get('title')) for paper in papers]
+        buckets = defaultdict(list)
+        for index, paper_shingles in enumerate(shingles):
+            if not paper_shingles:
+                continue
+            signature = self.signature(paper_shingles)
+            for band in range(self.bands):
+                buckets[(band, signature[band * self.rows:(band + 1) * self.rows].tobytes())].append(index)
+
+        checked = set()
+        for members in buckets.values():
+            for position, i in enumerate(members):
+                for j in members[position + 1:]:
+                    if (i, j) in checked or find(i) == find(j):
+                        continue
+                    checked.add((i, j))
+                    overlap = len(shingles[i] & shingles[j])
+                    if overlap / (len(shingles[i]) + len(shingles[j]) - overlap) >= self.threshold:
+                        union(i, j)
+
+        groups = defaultdict(list)
+        for index in range(len(papers)):
+            groups[find(index)].append(papers[index])
+        return [self.merge(group) for _, group in sorted(groups.items())]
+
+    def merge(self, group: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Combine the records of one paper, taking the most complete value of each field"""
+        if len(group) == 1:
+            return {**group[0], 'sources': [group[0].get('source')]}
+
+        best = max(group, key=lambda paper: paper.get('relevance_score', 0))
+        merged = dict(best)
+        merged['abstract'] = max((paper.get('abstract') or '' for paper in group), key=len)
+        merged['authors'] = max((paper.get('authors') or [] for paper in group), key=len)
+        years = [paper['year'] for paper in group if paper.get('year')]
+        merged['year'] = min(years) if years else None
+        merged['citations'] = max(paper.get('citations') or 0 for paper in group)
+        merged['categories'] = sorted({category for paper in group for category in paper.get('categories') or []})
+        for field in ('venue', 'url', 'doi', 'arxiv_id', 'published'):
+            merged[field] = best.get(field) or next((paper[field] for paper in group if paper.get(field)),
+                                                    best.get(field))
+        merged['sources'] = list(dict.fromkeys(paper.get('source') for paper in group))
+        return merged
@@ -0,0 +1,205 @@
+import os
+import re
+import time
+import logging
+from typing import Iterator, List, Dict, Any, Optional
+import requests
+from scholarly import scholarly
+import arxiv
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_paper(title: str = None, abstract: str = None, authors=None, year=None, published: str = None,
+                    venue: str = None, url: str = None, source: str = None, citations: int = None,
+                    doi: str = None, arxiv_id: str = None, categories: List[str] = None) -> Dict[str, Any]:
+    """Build the compact paper record every provider returns"""
+    if isinstance(authors, str):
+        authors = [name.strip() for name in authors.split(' and ')]
+    if year is None and published:
+        match = re.match(r'\d{4}', str(published))
+        year = int(match.group()) if match else None
+
+    return {
+        'title': ' '.join((title or '').split()),
+        'abstract': ' '.join((abstract or '').split()),
+        'authors': [name for name in (authors or []) if name],
+        'year': int(year) if year else None,
+        'published': published or (str(year) if year else ''),
+        'venue': venue or '',
+        'url': url or '',
+        'source': source,
+        'citations': int(citations or 0),
+        'doi': (doi or '').lower() or None,
+        'arxiv_id': arxiv_id or None,
+        'categories': categories or []
+    }
+
+
+class ProviderResults(list):
+    """Papers from one provider search, noting whether the search ran to completion"""
+
+    def __init__(self, papers=(), complete: bool = True):
+        super().__init__(papers)
+        self.complete = complete
+
+
+class PaperProvider:
+    """A paper source consumed lazily, stopping at a result count, page count or time limit"""
+
+    name = None
+    label = None
+    page_size = 10
+
+    def __init__(self, max_pages: int = None, time_limit: float = None):
+        self.max_pages = int(max_pages if max_pages is not None else os.getenv('PAPER_PROVIDER_MAX_PAGES', 3))
+        self.time_limit = float(time_limit if time_limit is not None
+                                else os.getenv('SCHOLARLY_PROVIDER_TIMEOUT', 6))
+
+    def iter_results(self, query: str, limit: int, deadline: float) -> Iterator[Any]:
+        """Yield raw results in ranking order, fetching pages only as they are consumed"""
+        raise NotImplementedError
+
+    def normalize(self, result: Any) -> Optional[Dict[str, Any]]:
+        """Convert a raw result to a paper record (None to skip it)"""
+        raise NotImplementedError
+
+    def effective_limit(self, limit: int) -> int:
+        """Get the most papers a search for limit can return, given the page cap"""
+        return min(limit, self.max_pages * self.page_size)
+
+    def search(self, query: str, limit: int = 5) -> ProviderResults:
+        """Get up to limit papers, keeping whatever was collected if the time limit or an error stops the search.
+
+        Such a search is returned with complete=False, since its papers are not the full
+        result for the query.
+        """
+        deadline = time.monotonic() + self.time_limit
+        max_results = self.effective_limit(limit)
+        papers = []
+        complete = True
+        results = self.iter_results(query, max_results, deadline)
+        try:
+            for result in results:
+                paper = self.normalize(result)
+                if paper and paper['title']:
+                    papers.append(paper)
+                if len(papers) >= max_results:
+                    break
+                if time.monotonic() >= deadline:
+                    logger.warning(f"{self.label} search stopped after {self.time_limit}s with {len(papers)} papers")
+                    complete = False
+                    break
+        except Exception as e:
+            logger.error(f"{self.label} search error: {str(e)}")
+            complete = False
+        finally:
+            results.close()
+        return ProviderResults(papers, complete)
+
+    __call__ = search
+
+
+class ArxivProvider(PaperProvider):
+    name = 'arxiv'
+    label = 'ArXiv'
+    page_size = 100
+
+    def iter_results(self, query, limit, deadline):
+        # The client requests pages of page_size, so a small limit costs a single small request
+        client = arxiv.Client(page_size=min(limit, self.page_size), num_retries=1)
+        search = arxiv.Search(query=query, max_results=limit, sort_by=arxiv.SortCriterion.Relevance)
+        yield from client.results(search)
+
+    def normalize(self, result):
+        return normalize_paper(
+            title=result.title,
+            abstract=result.summary,
+            authors=[author.name for author in result.authors],
+            published=result.published.isoformat(),
+            venue=result.journal_ref,
+            url=result.entry_id,
+            source=self.label,
+            doi=result.doi,
+            arxiv_id=re.sub(r'v\d+$', '', result.get_short_id()),
+            categories=result.categories
+        )
+
+
+class GoogleScholarProvider(PaperProvider):
+    name = 'google_scholar'
+    label = 'Google Scholar'
+    page_size = 10
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # Page fetches happen inside iteration, where the search deadline cannot interrupt
+        # them, so bound each request and do not retry past the deadline
+        scholarly.set_timeout(max(int(self.time_limit), 1))
+        scholarly.set_retries(1)
+
+    def iter_results(self, query, limit, deadline):
+        # search_pubs fetches the next page of ten only when iteration reaches it
+        yield from scholarly.search_pubs(query)
+
+    def normalize(self, result):
+        bib = result.get('bib', {}) if isinstance(result, dict) else result.bib
+        extra = result if isinstance(result, dict) else {}
+        return normalize_paper(
+            title=bib.get('title'),
+            abstract=bib.get('abstract'),
+            authors=bib.get('author'),
+            year=bib.get('pub_year') if str(bib.get('pub_year', '')).isdigit() else None,
+            venue=bib.get('venue'),
+            url=extra.get('pub_url') or bib.get('url'),
+            source=self.label,
+            citations=extra.get('num_citations')
+        )
+
+
+class SemanticScholarProvider(PaperProvider):
+    name = 'semantic_scholar'
+    label = 'Semantic Scholar'
+    page_size = 100
+
+    def __init__(self, api_url: str = None, **kwargs):
+        super().__init__(**kwargs)
+        self.api_url = api_url or os.getenv('SEMANTIC_SCHOLAR_API_URL', 'https://api.semanticscholar.org/graph/v1')
+
+    def iter_results(self, query, limit, deadline):
+        page_size = min(limit, self.page_size)
+        offset = 0
+        for _ in range(self.max_pages):
+            response = requests.get(f"{self.api_url}/paper/search", params={
+                'query': query,
+                'offset': offset,
+                'limit': page_size,
+                'fields': 'title,abstract,authors,year,url,citationCount,venue,externalIds'
+            }, timeout=max(deadline - time.monotonic(), 0.1))
+            if response.status_code != 200:
+                # Raised so the search is reported as cut short (rate limits included)
+                raise RuntimeError(f"Semantic Scholar API error: {response.status_code}")
+
+            data = response.json()
+            yield from data.get('data', [])
+            if 'next' not in data:
+                return
+            offset = data['next']
+
+    def normalize(self, item):
+        external_ids = item.get('externalIds') or {}
+        return normalize_paper(
+            title=item.get('title'),
+            abstract=item.get('abstract'),
+            authors=[author['name'] for author in item.get('authors') or []],
+            year=item.get('year'),
+            venue=item.get('venue'),
+            url=item.get('url'),
+            source=self.label,
+            citations=item.get('citationCount'),
+            doi=external_ids.get('DOI'),
+            arxiv_id=external_ids.get('ArXiv')
+        )
+
+
+DEFAULT_PROVIDERS = (ArxivProvider, GoogleScholarProvider, SemanticScholarProvider)
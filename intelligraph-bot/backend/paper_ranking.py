@@ -0,0 +1,63 @@
+import os
+import re
+from typing import List, Dict, Any
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+
+TOKEN_PATTERN = r'(?u)\b\w+\b'
+
+
+class BM25FScorer:
+    """Score papers against a query with BM25F over weighted title and abstract fields.
+
+    Term counts for the whole candidate set come from one sparse matrix per field, and
+    all papers are scored together. Scores are divided by the query's total idf, which
+    bounds them to [0, 1).
+    """
+
+    def __init__(self, k1: float = None, title_weight: float = None, abstract_weight: float = 1.0,
+                 title_b: float = 0.5, abstract_b: float = 0.75):
+        self.k1 = float(k1 if k1 is not None else os.getenv('PAPER_BM25_K1', 1.2))
+        self.weights = (float(title_weight if title_weight is not None
+                              else os.getenv('PAPER_BM25_TITLE_WEIGHT', 3.0)), abstract_weight)
+        self.b = (title_b, abstract_b)
+
+    def score(self, query: str, papers: List[Dict[str, Any]]) -> np.ndarray:
+        """Get each paper's relevance to the query"""
+        terms = list(dict.fromkeys(re.findall(TOKEN_PATTERN, query.lower())))
+        if not papers or not terms:
+            return np.zeros(len(papers))
+
+        titles = [paper.get('title') or '' for paper in papers]
+        abstracts = [paper.get('abstract') or '' for paper in papers]
+        vectorizer = CountVectorizer(token_pattern=TOKEN_PATTERN, dtype=np.float64)
+        try:
+            vectorizer.fit(titles + abstracts)
+        except ValueError:
+            # Nothing but empty fields
+            return np.zeros(len(papers))
+
+        vocabulary = vectorizer.vocabulary_
+        columns = [vocabulary[term] for term in terms if term in vocabulary]
+        if not columns:
+            return np.zeros(len(papers))
+
+        # Length-normalized term frequencies of the query terms, combined across fields
+        combined = np.zeros((len(papers), len(columns)))
+        present = np.zeros((len(papers), len(columns)), dtype=bool)
+        for texts, weight, b in zip((titles, abstracts), self.weights, self.b):
+            counts = vectorizer.transform(texts)
+            lengths = np.asarray(counts.sum(axis=1)).ravel()
+            average = lengths.mean() or 1.0
+            tf = counts[:, columns].toarray()
+            combined += weight * tf / (1 - b + b * lengths / average)[:, None]
+            present |= tf > 0
+
+        document_frequency = present.sum(axis=0)
+        idf = np.log(1 + (len(papers) - document_frequency + 0.5) / (document_frequency + 0.5))
+        scores = (idf * combined / (self.k1 + combined)).sum(axis=1)
+
+        # Query terms missing from every paper still count towards the maximum
+        missing = len(terms) - len(columns)
+        max_score = idf.sum() + missing * np.log(1 + (len(papers) + 0.5) / 0.5)
+        return scores / max_score
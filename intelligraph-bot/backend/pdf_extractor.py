@@ -0,0 +1,82 @@
+import os
+import shutil
+import logging
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Iterator
+import PyPDF2
+
+logger = logging.getLogger(__name__)
+
+
+def extract_page_range(path: str, start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end) from a PDF file (runs in worker processes)"""
+    with open(path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        return [reader.pages[i].extract_text() or '' for i in range(start, end)]
+
+
+class StreamingPDFExtractor:
+    """Yield PDF text page by page, fanning large files out across a process pool"""
+
+    def __init__(self, parallel_min_pages: int = None, workers: int = None,
+                 pages_per_task: int = None, max_pages_in_flight: int = None):
+        self.parallel_min_pages = int(parallel_min_pages if parallel_min_pages is not None
+                                      else os.getenv('PDF_PARALLEL_MIN_PAGES', 200))
+        self.workers = int(workers if workers is not None
+                           else os.getenv('PDF_WORKERS', os.cpu_count() or 1))
+        self.pages_per_task = int(pages_per_task if pages_per_task is not None
+                                  else os.getenv('PDF_PAGES_PER_TASK', 25))
+        # Bounds peak memory: at most this many extracted pages wait to be consumed
+        self.max_pages_in_flight = int(max_pages_in_flight if max_pages_in_flight is not None
+                                       else os.getenv('PDF_MAX_PAGES_IN_FLIGHT', 200))
+
+    def iter_pages(self, source) -> Iterator[str]:
+        """Yield the text of each page of a PDF given as a path or file object"""
+        if isinstance(source, str):
+            with open(source, 'rb') as f:
+                yield from self.iter_pages_from(f, source)
+        else:
+            yield from self.iter_pages_from(source, None)
+
+    def iter_pages_from(self, file, path) -> Iterator[str]:
+        """Yield page text sequentially, or in parallel for large documents"""
+        reader = PyPDF2.PdfReader(file)
+        page_count = len(reader.pages)
+
+        if self.workers <= 1 or page_count < self.parallel_min_pages:
+            for page in reader.pages:
+                yield page.extract_text() or ''
+            return
+
+        del reader
+        if path is not None:
+            yield from self.iter_pages_parallel(path, page_count)
+            return
+
+        # Workers re-open the document, so spool uploads to a temporary file first
+        file.seek(0)
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as spool:
+            shutil.copyfileobj(file, spool)
+        try:
+            yield from self.iter_pages_parallel(spool.name, page_count)
+        finally:
+            os.unlink(spool.name)
+
+    def iter_pages_parallel(self, path: str, page_count: int) -> Iterator[str]:
+        """Extract page ranges on a process pool, yielding pages in order"""
+        ranges = deque((start, min(start + self.pages_per_task, page_count))
+                       for start in range(0, page_count, self.pages_per_task))
+        max_tasks = max(1, self.max_pages_in_flight // self.pages_per_task)
+        logger.info(f"Extracting {page_count} PDF pages with {self.workers} workers")
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            while ranges or pending:
+                # Keep a bounded window of ranges submitted ahead of the consumer
+                while ranges and len(pending) < max_tasks:
+                    start, end = ranges.popleft()
+                    pending.append(executor.submit(extract_page_range, path, start, end))
+
+                yield from pending.popleft().result()
@@ -0,0 +1,171 @@
+import os
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from typing import List, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# Operators that touch every node (or every node with a label) instead of an index
+SCAN_OPERATORS = {'AllNodesScan', 'NodeByLabelScan', 'DirectedAllRelationshipsScan',
+                  'UndirectedAllRelationshipsScan', 'DirectedRelationshipTypeScan',
+                  'UndirectedRelationshipTypeScan'}
+
+
+class QueryProfiler:
+    """Record Cypher query latency and capture PROFILE plans for slow queries"""
+
+    def __init__(self, threshold_ms: float = None, log_size: int = None):
+        self.threshold_ms = float(threshold_ms if threshold_ms is not None
+                                  else os.getenv('SLOW_QUERY_THRESHOLD_MS', 200))
+        self.log_size = int(log_size if log_size is not None
+                            else os.getenv('SLOW_QUERY_LOG_SIZE', 100))
+        # A query name is re-run under PROFILE at most once per interval
+        self.profile_interval = float(os.getenv('SLOW_QUERY_PROFILE_INTERVAL', 60))
+        self.slow_queries = deque(maxlen=self.log_size)
+        self.query_stats = {}
+        self.last_profiled = {}
+        self.lock = threading.Lock()
+        self.driver = None
+        self.profile_queue = queue.Queue(maxsize=16)
+        self.worker = None
+
+    def attach(self, driver):
+        """Use this driver to open the sessions slow queries are profiled in"""
+        self.driver = driver
+
+    def run(self, session, name: str, query: str, **params) -> List[Any]:
+        """Run a query in the given session, recording latency and rows returned"""
+        start = time.perf_counter()
+        result = session.run(query, **params)
+        records = list(result)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        self.record(name, elapsed_ms, len(records))
+
+        if elapsed_ms >= self.threshold_ms:
+            self.capture_slow_query(name, query, params, elapsed_ms, len(records))
+
+        return records
+
+    def record(self, name: str, elapsed_ms: float, rows: int):
+        """Update aggregate statistics for a named query"""
+        with self.lock:
+            stats = self.query_stats.setdefault(name, {
+                'calls': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'total_rows': 0,
+                'slow_calls': 0
+            })
+            stats['calls'] += 1
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            stats['total_rows'] += rows
+            if elapsed_ms >= self.threshold_ms:
+                stats['slow_calls'] += 1
+
+    def capture_slow_query(self, name: str, query: str, params: Dict[str, Any],
+                           elapsed_ms: float, rows: int):
+        """Store a slow query in the ring buffer and queue it for profiling in the background"""
+        entry = {
+            'name': name,
+            'query': ' '.join(query.split()),
+            'parameters': {k: repr(v)[:200] for k, v in params.items()},
+            'elapsed_ms': round(elapsed_ms, 2),
+            'rows': rows,
+            'captured_at': datetime.now().isoformat(),
+            'plan': None,
+            'plan_status': 'skipped'
+        }
+        logger.warning(f"Slow query {name}: {entry['elapsed_ms']}ms, {rows} rows")
+
+        now = time.monotonic()
+        with self.lock:
+            self.slow_queries.append(entry)
+            if self.driver is None or now - self.last_profiled.get(name, float('-inf')) < self.profile_interval:
+                return
+            try:
+                self.profile_queue.put_nowait((entry, query, params))
+            except queue.Full:
+                return
+            self.last_profiled[name] = now
+            entry['plan_status'] = 'pending'
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.profile_worker, name='query-profiler', daemon=True)
+                self.worker.start()
+
+    def profile_worker(self):
+        """Re-run queued slow queries under PROFILE, off the request that ran them"""
+        while True:
+            entry, query, params = self.profile_queue.get()
+            plan, status = None, 'failed'
+            try:
+                with self.driver.session() as session:
+                    # Profile inside a transaction that is rolled back so writes are not repeated
+                    tx = session.begin_transaction()
+                    try:
+                        summary = tx.run("PROFILE " + query, **params).consume()
+                    finally:
+                        tx.rollback()
+                if summary.profile:
+                    plan = self.summarize_plan(summary.profile)
+                status = 'captured'
+            except Exception as e:
+                logger.error(f"Failed to profile slow query {entry['name']}: {str(e)}")
+
+            with self.lock:
+                entry['plan'] = plan
+                entry['plan_status'] = status
+
+    def summarize_plan(self, profile: Dict[str, Any]) -> Dict[str, Any]:
+        """Flatten a PROFILE plan into operators, db hits and detected scans"""
+        operators = []
+        stack = [(profile, 0)]
+
+        while stack:
+            node, depth = stack.pop()
+            operator_type = node.get('operatorType', '').split('@')[0]
+            operators.append({
+                'operator': operator_type,
+                'depth': depth,
+                'db_hits': node.get('dbHits', 0),
+                'rows': node.get('rows', 0),
+                'details': node.get('args', {}).get('Details', '')
+            })
+            for child in reversed(node.get('children', [])):
+                stack.append((child, depth + 1))
+
+        return {
+            'total_db_hits': sum(op['db_hits'] for op in operators),
+            'operators': operators,
+            'scans': [op['operator'] for op in operators if op['operator'] in SCAN_OPERATORS]
+        }
+
+    def get_report(self) -> Dict[str, Any]:
+        """Get aggregate query statistics and the captured slow queries"""
+        with self.lock:
+            queries = {}
+            for name, stats in self.query_stats.items():
+                queries[name] = {
+                    **stats,
+                    'total_ms': round(stats['total_ms'], 2),
+                    'max_ms': round(stats['max_ms'], 2),
+                    'avg_ms': round(stats['total_ms'] / stats['calls'], 2) if stats['calls'] else 0.0
+                }
+
+            return {
+                'threshold_ms': self.threshold_ms,
+                'queries': queries,
+                'slow_queries': list(reversed(self.slow_queries))
+            }
+
+    def reset(self):
+        """Clear recorded statistics and slow queries"""
+        with self.lock:
+            self.query_stats.clear()
+            self.slow_queries.clear()
+            self.last_profiled.clear()
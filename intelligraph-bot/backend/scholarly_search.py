@@ -1,17 +1,44 @@
 import os
+import time
 import spacy
 import json
-from typing import List, Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Callable, Tuple
 import logging
 from datetime import datetime
-import requests
-from scholarly import scholarly
-import arxiv
+import pandas as pd
+from paper_providers import ArxivProvider, GoogleScholarProvider, SemanticScholarProvider, DEFAULT_PROVIDERS
+from paper_cache import PaperCache, normalize_query
+from paper_dedup import PaperDeduplicator
+from paper_ranking import BM25FScorer
 
 logger = logging.getLogger(__name__)
 
 class ScholarlySearch:
-    def __init__(self):
+    def __init__(self, providers: Dict[str, Callable[[str, int], List[Dict[str, Any]]]] = None,
+                 budget: float = None, provider_timeouts: Dict[str, float] = None, cache: PaperCache = None):
+        # Providers are callables (query, limit) -> papers, so tests can inject local fakes
+        self.providers = providers or {provider.name: provider() for provider in DEFAULT_PROVIDERS}
+        self.budget = float(budget if budget is not None else os.getenv('SCHOLARLY_SEARCH_BUDGET', 8))
+        default_timeout = float(os.getenv('SCHOLARLY_PROVIDER_TIMEOUT', 6))
+        self.provider_timeouts = {name: (provider_timeouts or {}).get(name, default_timeout)
+                                  for name in self.providers}
+        self.cache = cache or PaperCache()
+        # Papers requested per provider for trends; each provider still stops at its page
+        # cap (PAPER_PROVIDER_MAX_PAGES pages, so 30 for Google Scholar by default)
+        self.trend_candidates = int(os.getenv('SCHOLARLY_TREND_CANDIDATES', 100))
+        self.deduplicator = PaperDeduplicator()
+        self.scorer = BM25FScorer()
+        self.inflight = {}
+        self.lock = threading.Lock()
+        # Each provider gets its own small pool, so calls hung in one provider cannot take
+        # the threads of the others; abandoned calls keep their thread until they return
+        self.provider_workers = int(os.getenv('SCHOLARLY_PROVIDER_WORKERS', 2))
+        self.executors = {name: ThreadPoolExecutor(max_workers=self.provider_workers,
+                                                   thread_name_prefix=f'scholarly-{name}')
+                          for name in self.providers}
+        self.running = {name: 0 for name in self.providers}
         self.setup_nlp()
     
     def setup_nlp(self):
@@ -22,202 +49,204 @@ class ScholarlySearch:
             logger.info("NLP model loaded successfully")
         except Exception as e:
             logger.error(f"Failed to load NLP model: {e}")
+            self.nlp = None
 
     def search_papers(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Search for academic papers using multiple sources"""
         papers = []
+        results, _ = self.fan_out(query, max(limit // 2, 1))
+        for name, provider_papers in results.items():
+            papers.extend(provider_papers)
         
-        # Search ArXiv
-        arxiv_papers = self.search_arxiv(query, limit=limit//2)
-        papers.extend(arxiv_papers)
+        # With every provider down or late, answer from the papers seen before
+        if not papers:
+            return self.search_local(query, limit)
         
-        # Search Google Scholar
-        scholar_papers = self.search_google_scholar(query, limit=limit//2)
-        papers.extend(scholar_papers)
+        # Score all candidates together, then remove duplicates and sort by relevance
+        unique_papers = self.deduplicate_papers(self.score_papers(query, papers))
         
-        # Search Semantic Scholar
-        semantic_papers = self.search_semantic_scholar(query, limit=limit//2)
-        papers.extend(semantic_papers)
+        return unique_papers[:limit]
+    
+    def fan_out(self, query: str, limit: int) -> Tuple[Dict[str, List[Dict[str, Any]]], bool]:
+        """Query all providers concurrently and return what arrives within the deadlines.
         
-        # Remove duplicates and sort by relevance
-        unique_papers = self.deduplicate_papers(papers)
+        Returns the papers per provider and whether the set is complete: every provider
+        answered in time with a search that ran to completion.
         
-        return unique_papers[:limit]
+        Each provider gets its own deadline, capped by the overall budget. Providers that
+        miss it are left running and their results are cached for the next identical search.
+        Cached results are served without waiting, and stale ones are refreshed in the background.
+        A provider whose workers are all still busy is skipped rather than queued behind them.
+        """
+        started = time.monotonic()
+        results = {}
+        pending = {}
+        complete = True
+        
+        for name, provider in self.providers.items():
+            # Ask for no more than the provider can return, so its cached result sets match
+            provider_limit = provider.effective_limit(limit) if hasattr(provider, 'effective_limit') else limit
+            cached = self.cache.get_results(name, query, provider_limit)
+            if cached is not None:
+                results[name] = cached['papers']
+                if not cached['fresh']:
+                    self.submit(name, query, cached['max_results'])
+                continue
+            future = self.submit(name, query, provider_limit)
+            if future is None:
+                complete = False
+                continue
+            pending[future] = (name, started + min(self.provider_timeouts[name], self.budget))
+        
+        while pending:
+            timeout = min(deadline for _, deadline in pending.values()) - time.monotonic()
+            done, _ = wait(pending, timeout=max(timeout, 0), return_when=FIRST_COMPLETED)
+            for future in done:
+                name, _ = pending.pop(future)
+                try:
+                    results[name] = future.result()
+                    complete = complete and getattr(results[name], 'complete', True)
+                except Exception as e:
+                    logger.error(f"{name} search failed: {e}")
+                    complete = False
+            now = time.monotonic()
+            for future, (name, deadline) in list(pending.items()):
+                if deadline <= now:
+                    logger.warning(f"{name} missed its {deadline - started:.1f}s deadline for '{query}'")
+                    del pending[future]
+                    complete = False
+        
+        return results, complete
     
-    def search_google_scholar(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """Search Google Scholar for articles"""
+    def submit(self, name: str, query: str, limit: int):
+        """Start a provider call, sharing one already in flight for the same search.
+        
+        Returns None when every worker of the provider is busy with earlier calls.
+        """
+        key = (name, normalize_query(query), limit)
+        with self.lock:
+            future = self.inflight.get(key)
+            if future is not None:
+                return future
+            if self.running[name] >= self.provider_workers:
+                logger.warning(f"{name} has {self.running[name]} calls still running, skipping '{query}'")
+                return None
+            future = self.executors[name].submit(self.providers[name], query, limit)
+            self.running[name] += 1
+            self.inflight[key] = future
+        # Outside the lock: a call that already finished runs the callback right here
+        future.add_done_callback(lambda done: self.store_result(key, done))
+        return future
+    
+    def store_result(self, key, future):
+        """Cache a finished provider call, including ones that finished after their deadline"""
+        with self.lock:
+            self.inflight.pop(key, None)
+            self.running[key[0]] -= 1
+        if future.cancelled() or future.exception() is not None:
+            return
         try:
-            results = scholarly.search_pubs(query)
-            return [
-                {
-                    "title": result.bib.get("title"),
-                    "author": result.bib.get("author"),
-                    "abstract": result.bib.get("abstract"),
-                    "url": result.bib.get("url")
-                }
-                for result in results
-            ]
+            papers = future.result()
+            self.cache.put_results(*key, papers, complete=getattr(papers, 'complete', True))
         except Exception as e:
-            logger.error(f"Google Scholar search failed: {e}")
-            return []
+            logger.error(f"Failed to cache {key[0]} results: {e}")
     
-    def search_arxiv(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """Search arXiv for articles"""
+    def search_local(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Search the papers cached from earlier searches without touching the network"""
         try:
-            search = arxiv.Search(
-                query=query,
-                max_results=limit,
-                sort_by=arxiv.SortCriterion.Relevance
-            )
-            
-            papers = []
-            for result in search.results():
-                paper = {
-                    'title': result.title,
-                    'abstract': result.summary,
-                    'authors': [author.name for author in result.authors],
-                    'published': result.published.isoformat(),
-                    'url': result.entry_id,
-                    'source': 'ArXiv',
-                    'categories': result.categories,
-                    'relevance_score': self.calculate_relevance(query, result.title, result.summary)
-                }
-                papers.append(paper)
-            
-            return papers
-            
+            return self.deduplicate_papers(self.score_papers(query, self.cache.search_local(query, limit)))
         except Exception as e:
-            logger.error(f"ArXiv search error: {str(e)}")
+            logger.error(f"Local paper search error: {str(e)}")
             return []
     
+    def search_google_scholar(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Search Google Scholar for articles"""
+        return self.score_papers(query, GoogleScholarProvider()(query, limit))
+    
+    def search_arxiv(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Search arXiv for articles"""
+        return self.score_papers(query, ArxivProvider()(query, limit))
+    
     def search_semantic_scholar(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
         """Search Semantic Scholar for papers"""
+        return self.score_papers(query, SemanticScholarProvider()(query, limit))
+    
+    def score_papers(self, query: str, papers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Copy provider records with their relevance to the query added"""
         try:
-            url = "https://api.semanticscholar.org/graph/v1/paper/search"
-            params = {
-                'query': query,
-                'limit': limit,
-                'fields': 'title,abstract,authors,year,url,citationCount,venue'
-            }
-            
-            response = requests.get(url, params=params)
-            
-            if response.status_code == 200:
-                data = response.json()
-                papers = []
-                
-                for item in data.get('data', []):
-                    paper = {
-                        'title': item.get('title', ''),
-                        'abstract': item.get('abstract', ''),
-                        'authors': [author['name'] for author in item.get('authors', [])],
-                        'published': str(item.get('year', '')),
-                        'url': item.get('url', ''),
-                        'source': 'Semantic Scholar',
-                        'citations': item.get('citationCount', 0),
-                        'venue': item.get('venue', ''),
-                        'relevance_score': self.calculate_relevance(query, item.get('title', ''), item.get('abstract', ''))
-                    }
-                    papers.append(paper)
-                
-                return papers
-            else:
-                logger.error(f"Semantic Scholar API error: {response.status_code}")
-                return []
-                
+            scores = self.scorer.score(query, papers)
         except Exception as e:
-            logger.error(f"Semantic Scholar search error: {str(e)}")
-            return []
+            logger.error(f"Relevance calculation error: {str(e)}")
+            scores = [0.0] * len(papers)
+        return [{**paper, 'relevance_score': round(float(score), 4)} for paper, score in zip(papers, scores)]
     
     def calculate_relevance(self, query: str, title: str, abstract: str) -> float:
         """Calculate relevance score for a paper"""
-        try:
-            query_lower = query.lower()
-            title_lower = title.lower()
-            abstract_lower = abstract.lower()
-            
-            score = 0.0
-            
-            # Title matching (higher weight)
-            if query_lower in title_lower:
-                score += 0.5
-            
-            # Abstract matching
-            if query_lower in abstract_lower:
-                score += 0.3
-            
-            # Individual word matching
-            query_words = query_lower.split()
-            title_words = title_lower.split()
-            abstract_words = abstract_lower.split()
-            
-            for word in query_words:
-                if word in title_words:
-                    score += 0.1
-                if word in abstract_words:
-                    score += 0.05
-            
-            return min(score, 1.0)  # Cap at 1.0
-            
-        except Exception as e:
-            logger.error(f"Relevance calculation error: {str(e)}")
-            return 0.0
+        return self.score_papers(query, [{'title': title, 'abstract': abstract}])[0]['relevance_score']
     
     def deduplicate_papers(self, papers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Remove duplicate papers based on title similarity"""
-        unique_papers = []
-        seen_titles = set()
-        
-        for paper in papers:
-            title = paper.get('title', '').lower().strip()
-            if title and title not in seen_titles:
-                seen_titles.add(title)
-                unique_papers.append(paper)
+        """Merge duplicate papers matched by identifier or near-identical title"""
+        unique_papers = self.deduplicator.deduplicate([paper for paper in papers if paper.get('title')])
         
         # Sort by relevance score
         unique_papers.sort(key=lambda x: x.get('relevance_score', 0), reverse=True)
         
         return unique_papers
     
-    def extract_entities_from_papers(self, papers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def extract_entities_from_papers(self, papers: List[Dict[str, Any]], batch_size: int = None,
+                                     n_process: int = None) -> List[Dict[str, Any]]:
         """Extract entities from paper abstracts"""
         entities = []
         
         if not self.nlp:
             return entities
         
-        for paper in papers:
-            abstract = paper.get('abstract', '')
-            if abstract:
-                doc = self.nlp(abstract)
-                
-                for ent in doc.ents:
-                    entities.append({
-                        'text': ent.text,
-                        'label': ent.label_,
-                        'description': spacy.explain(ent.label_),
-                        'paper_title': paper.get('title', ''),
-                        'paper_url': paper.get('url', '')
-                    })
+        batch_size = batch_size or int(os.getenv('NLP_BATCH_SIZE', 64))
+        n_process = n_process or int(os.getenv('NLP_N_PROCESS', os.cpu_count() or 1))
+        if len(papers) < batch_size * 2:
+            n_process = 1
+        
+        # Only named entities are needed, so skip every other component
+        disable = [name for name in self.nlp.pipe_names if name not in ('tok2vec', 'ner')]
+        abstracts = ((paper['abstract'], index) for index, paper in enumerate(papers) if paper.get('abstract'))
+        
+        for doc, index in self.nlp.pipe(abstracts, as_tuples=True, batch_size=batch_size,
+                                        n_process=n_process, disable=disable):
+            paper = papers[index]
+            for ent in doc.ents:
+                entities.append({
+                    'text': ent.text,
+                    'label': ent.label_,
+                    'description': spacy.explain(ent.label_),
+                    'paper_title': paper.get('title', ''),
+                    'paper_url': paper.get('url', '')
+                })
         
         return entities
     
     def get_research_trends(self, query: str, years: int = 5) -> Dict[str, Any]:
-        """Get research trends for a specific topic"""
+        """Get research trends for a specific topic.
+        
+        Trends are computed from up to trend_candidates papers per provider, fewer where a
+        provider's page cap is lower, so counts describe a sample of the topic.
+        """
         try:
             current_year = datetime.now().year
-            trends = {}
+            year_range = list(range(current_year - years, current_year + 1))
             
-            for year in range(current_year - years, current_year + 1):
-                year_query = f"{query} AND year:{year}"
-                papers = self.search_papers(year_query, limit=20)
-                
-                trends[str(year)] = {
-                    'count': len(papers),
-                    'top_venues': self.get_top_venues(papers),
-                    'top_authors': self.get_top_authors(papers)
-                }
+            # One larger retrieval per provider, bucketed by year, instead of a search per year
+            aggregates = self.cache.get_trends(query, year_range)
+            if aggregates is None:
+                papers = []
+                results, complete = self.fan_out(query, self.trend_candidates)
+                for provider_papers in results.values():
+                    papers.extend(provider_papers)
+                aggregates = self.aggregate_trends(self.deduplicate_papers(papers), year_range)
+                # A partial sample is still returned, but cached only once every provider answered
+                if complete and papers:
+                    self.cache.put_trends(query, aggregates)
             
+            trends = {str(year): aggregates[year] for year in year_range}
             return {
                 'query': query,
                 'trends': trends,
@@ -228,26 +257,34 @@ class ScholarlySearch:
             logger.error(f"Research trends error: {str(e)}")
             return {}
     
-    def get_top_venues(self, papers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Get top venues from papers"""
-        venues = {}
+    def aggregate_trends(self, papers: List[Dict[str, Any]], years: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Count papers, top venues and top authors per publication year"""
+        frame = pd.DataFrame({
+            'year': pd.to_numeric(pd.Series([paper.get('year') for paper in papers], dtype=object),
+                                  errors='coerce'),
+            'venue': [paper.get('venue') or '' for paper in papers],
+            'authors': [paper.get('authors') or [] for paper in papers]
+        })
+        frame = frame[frame['year'].isin(years)].astype({'year': int})
         
-        for paper in papers:
-            venue = paper.get('venue', 'Unknown')
-            if venue and venue != 'Unknown':
-                venues[venue] = venues.get(venue, 0) + 1
+        counts = frame.groupby('year').size()
+        venues = self.top_per_year(frame[frame['venue'] != ''], 'venue', 5)
+        authors = self.top_per_year(frame.explode('authors').dropna(subset=['authors']), 'authors', 10)
         
-        return [{'venue': k, 'count': v} for k, v in sorted(venues.items(), key=lambda x: x[1], reverse=True)][:5]
+        return {year: {
+            'count': int(counts.get(year, 0)),
+            'top_venues': [{'venue': venue, 'count': count} for venue, count in venues.get(year, [])],
+            'top_authors': [{'author': author, 'count': count} for author, count in authors.get(year, [])]
+        } for year in years}
     
-    def get_top_authors(self, papers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Get top authors from papers"""
-        authors = {}
-        
-        for paper in papers:
-            for author in paper.get('authors', []):
-                authors[author] = authors.get(author, 0) + 1
-        
-        return [{'author': k, 'count': v} for k, v in sorted(authors.items(), key=lambda x: x[1], reverse=True)][:10]
+    def top_per_year(self, frame: pd.DataFrame, column: str, limit: int) -> Dict[int, List[tuple]]:
+        """Get the most frequent values of a column in each year as (value, count) pairs"""
+        counts = frame.groupby(['year', column]).size().reset_index(name='count')
+        counts = counts.sort_values(['year', 'count', column], ascending=[True, False, True])
+        top = {}
+        for year, value, count in counts.groupby('year').head(limit).itertuples(index=False):
+            top.setdefault(int(year), []).append((value, int(count)))
+        return top
 
 # Example usage and testing
 if __name__ == '__main__':
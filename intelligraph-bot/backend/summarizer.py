@@ -0,0 +1,115 @@
+import os
+import re
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import List
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_SPLIT = re.compile(r'[.!?]+')
+
+
+class TextRankSummarizer:
+    """Extractive summaries ranked by TextRank over a sparse TF-IDF sentence graph"""
+
+    def __init__(self, max_sentences: int = None, cache_size: int = None, redundancy_threshold: float = None,
+                 damping: float = 0.85, max_iterations: int = 100, tolerance: float = 1e-6):
+        # Longer inputs are sampled down to this many sentences to bound the graph size
+        self.max_sentences = int(max_sentences if max_sentences is not None
+                                 else os.getenv('SUMMARY_MAX_SENTENCES', 1500))
+        self.cache_size = int(cache_size if cache_size is not None
+                              else os.getenv('SUMMARY_CACHE_SIZE', 256))
+        # Sentences at least this similar to one already in the summary are skipped
+        self.redundancy_threshold = float(redundancy_threshold if redundancy_threshold is not None
+                                          else os.getenv('SUMMARY_REDUNDANCY_THRESHOLD', 0.7))
+        self.damping = damping
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def summarize(self, text: str, max_sentences: int = 3) -> str:
+        """Summarize text in its top-ranked sentences, kept in document order (cached)"""
+        key = hashlib.sha1(f"{max_sentences}\n{text}".encode('utf-8')).hexdigest()
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+
+        summary = self.rank_summary(text, max_sentences)
+
+        with self.lock:
+            self.cache[key] = summary
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return summary
+
+    def split_sentences(self, text: str) -> List[str]:
+        """Split text into candidate sentences"""
+        sentences = (sentence.strip() for sentence in SENTENCE_SPLIT.split(text))
+        return [sentence for sentence in sentences if len(sentence) > 10]
+
+    def rank_summary(self, text: str, max_sentences: int) -> str:
+        """Pick the top sentences by TextRank"""
+        sentences = self.split_sentences(text)
+        if len(sentences) <= max_sentences:
+            return '. '.join(sentences)
+
+        if len(sentences) > self.max_sentences:
+            # Evenly spaced sample, so every part of the document stays represented
+            sample = np.unique(np.linspace(0, len(sentences) - 1, self.max_sentences).astype(int))
+            sentences = [sentences[i] for i in sample]
+
+        try:
+            matrix = TfidfVectorizer(stop_words='english', sublinear_tf=True).fit_transform(sentences)
+        except ValueError:
+            # Nothing but stop words: fall back to the opening sentences
+            return '. '.join(list(dict.fromkeys(sentences))[:max_sentences])
+
+        scores = self.textrank(matrix)
+        top = self.select_diverse(sentences, matrix, scores, max_sentences)
+        return '. '.join(sentences[i] for i in top)
+
+    def select_diverse(self, sentences: List[str], matrix, scores: np.ndarray, max_sentences: int) -> List[int]:
+        """Pick sentences by score, skipping repeats and near-repeats of ones already picked"""
+        selected = []
+        seen = set()
+        # Stable sort so equal scores favour earlier sentences
+        for i in np.argsort(-scores, kind='stable'):
+            if sentences[i] in seen:
+                continue
+            if selected and (matrix[selected] @ matrix[i].T).max() >= self.redundancy_threshold:
+                continue
+            selected.append(i)
+            seen.add(sentences[i])
+            if len(selected) == max_sentences:
+                break
+        return sorted(selected)
+
+    def textrank(self, matrix) -> np.ndarray:
+        """Run PageRank over the cosine similarity graph of the rows of a TF-IDF matrix"""
+        # Rows are L2-normalized, so the product is the cosine similarity matrix
+        similarity = (matrix @ matrix.T).tocsr()
+        similarity.setdiag(0)
+        similarity.eliminate_zeros()
+
+        count = similarity.shape[0]
+        degree = np.asarray(similarity.sum(axis=1)).ravel()
+        dangling = degree == 0
+        degree[dangling] = 1.0
+        transition = similarity.T.tocsr()
+
+        scores = np.full(count, 1.0 / count)
+        for _ in range(self.max_iterations):
+            # Sentences with no similar sentences spread their score evenly
+            spread = scores[dangling].sum() / count
+            updated = (1 - self.damping) / count + self.damping * (transition @ (scores / degree) + spread)
+            converged = np.abs(updated - scores).sum() < self.tolerance
+            scores = updated
+            if converged:
+                break
+        return scores
@@ -0,0 +1,54 @@
+import io
+import os
+import sys
+import importlib
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='module')
+def app_module(tmp_path_factory):
+    """The Flask app with every store in a temporary directory"""
+    pytest.importorskip('scholarly')
+    pytest.importorskip('arxiv')
+    data = tmp_path_factory.mktemp('data')
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        for name, value in {
+            'DOCUMENT_STORE_PATH': data / 'documents.db',
+            'DOCUMENT_REGISTRY_URL': f"sqlite:///{data / 'registry.db'}",
+            'EXTRACTION_CACHE_PATH': data / 'extraction_cache.db',
+            'KEYWORD_STATS_PATH': data / 'keywords.db',
+            'VECTOR_INDEX_PATH': data / 'vectors',
+            'PAPER_CACHE_PATH': data / 'papers.db',
+        }.items():
+            monkeypatch.setenv(name, str(value))
+        yield importlib.import_module('app')
+
+
+def test_upload_over_max_content_length_is_413(app_module, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'MAX_CONTENT_LENGTH', 1024)
+    client = app_module.app.test_client()
+
+    response = client.post('/api/upload-document',
+                           data={'file': (io.BytesIO(b'x' * 4096), 'big.txt')},
+                           content_type='multipart/form-data')
+
+    assert response.status_code == 413
+    assert 'byte limit' in response.get_json()['error']
+
+
+@pytest.mark.parametrize('limit', [0, -3])
+def test_suggest_limit_has_a_lower_bound(app_module, monkeypatch, limit):
+    seen = {}
+
+    def suggest_entities(prefix, limit):
+        seen['limit'] = limit
+        return []
+
+    monkeypatch.setattr(app_module.kg, 'suggest_entities', suggest_entities)
+    response = app_module.app.test_client().get(f'/api/suggest?q=ada&limit={limit}')
+
+    assert response.status_code == 200
+    assert seen['limit'] == 1
@@ -0,0 +1,61 @@
+import os
+import sys
+
+import pytest
+import spacy
+from spacy.tokens import Doc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document_processor import DocumentProcessor, NLP_OUTPUTS
+
+
+def make_processor(nlp=None):
+    """A processor with only what relation extraction needs (no stores or models)"""
+    processor = DocumentProcessor.__new__(DocumentProcessor)
+    processor.nlp = nlp
+    processor.relation_patterns = {'direct', 'svo', 'prep', 'appos'}
+    return processor
+
+
+def parsed_doc(lemmas=None):
+    """'Google acquired DeepMind in London' parsed by hand, optionally without lemmas"""
+    nlp = spacy.blank('en')
+    return Doc(nlp.vocab,
+               words=['Google', 'acquired', 'DeepMind', 'in', 'London'],
+               heads=[1, 1, 1, 1, 3],
+               deps=['nsubj', 'ROOT', 'dobj', 'prep', 'pobj'],
+               pos=['PROPN', 'VERB', 'PROPN', 'ADP', 'PROPN'],
+               lemmas=lemmas,
+               ents=['B-ORG', 'O', 'B-ORG', 'O', 'B-GPE'])
+
+
+def test_relation_outputs_keep_lemma_components():
+    assert {'tagger', 'attribute_ruler', 'lemmatizer', 'parser', 'ner'} <= NLP_OUTPUTS['relations']
+
+
+def test_relation_types_use_lemmas():
+    doc = parsed_doc(lemmas=['Google', 'acquire', 'DeepMind', 'in', 'London'])
+    types = {(r['source'], r['target'], r['type']) for r in make_processor().extract_relationships(doc)}
+    assert ('Google', 'DeepMind', 'acquire') in types
+    assert ('Google', 'London', 'acquire_in') in types
+
+
+def test_relation_types_fall_back_to_lowercase_without_lemmas():
+    relations = make_processor().extract_relationships(parsed_doc())
+    types = {(r['source'], r['target'], r['type']) for r in relations}
+    assert ('Google', 'DeepMind', 'acquired') in types
+    assert ('Google', 'London', 'acquired_in') in types
+    assert all(r['type'] and not r['type'].startswith('_') for r in relations)
+
+
+@pytest.mark.skipif(not spacy.util.is_package('en_core_web_sm'), reason='en_core_web_sm is not installed')
+def test_restricted_pipeline_produces_typed_relations():
+    processor = make_processor(spacy.load('en_core_web_sm'))
+    outputs = {'relations'}
+    doc = processor.nlp("Google acquired DeepMind in London.",
+                        disable=processor.components_to_disable(outputs))
+    relations = processor.analyze_doc(doc, doc.text, 'test', outputs)['relations']
+    assert relations
+    assert all(r['type'] and not r['type'].startswith('_') for r in relations)
+    assert 'acquire' in {r['type'] for r in relations}
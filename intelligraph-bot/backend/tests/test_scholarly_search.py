@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip('scholarly')
+pytest.importorskip('arxiv')
+
+from paper_cache import PaperCache
+from scholarly_search import ScholarlySearch
+
+
+def fake_provider(delay: float = 0.0, year: int = None, calls: list = None):
+    """A provider callable returning one paper per query after an injected delay"""
+    year = year or time.localtime().tm_year
+
+    def search(query, limit):
+        if calls is not None:
+            calls.append(query)
+        time.sleep(delay)
+        return [{'title': f'{query} from a provider {delay}', 'abstract': query, 'year': year,
+                 'authors': ['Ada Lovelace'], 'venue': 'Journal', 'source': 'fake'}]
+    return search
+
+
+def make_search(providers, timeouts=None, budget=5.0):
+    search = ScholarlySearch(providers=providers, budget=budget, provider_timeouts=timeouts,
+                             cache=PaperCache(':memory:'))
+    search.nlp = None
+    return search
+
+
+def test_trends_from_a_partial_fan_out_are_not_cached():
+    search = make_search({'fast': fake_provider(), 'slow': fake_provider(delay=0.5)}, timeouts={'slow': 0.1})
+
+    trends = search.get_research_trends('graph learning', years=1)
+
+    assert trends['total_papers'] == 1
+    assert search.cache.get_trends('graph learning', [int(year) for year in trends['trends']]) is None
+
+
+def test_trends_are_cached_when_every_provider_answers():
+    search = make_search({'a': fake_provider(), 'b': fake_provider(delay=0.01)})
+
+    trends = search.get_research_trends('graph learning', years=1)
+
+    assert search.cache.get_trends('graph learning', [int(year) for year in trends['trends']]) is not None
+
+
+def test_slow_provider_is_dropped_at_its_deadline():
+    search = make_search({'fast': fake_provider(), 'slow': fake_provider(delay=0.5)}, timeouts={'slow': 0.1})
+
+    started = time.monotonic()
+    results, complete = search.fan_out('knowledge graphs', 5)
+
+    assert time.monotonic() - started < 0.4
+    assert set(results) == {'fast'}
+    assert not complete
+
+
+def test_late_result_is_cached_and_served_next_time():
+    calls = []
+    search = make_search({'slow': fake_provider(delay=0.3, calls=calls)}, timeouts={'slow': 0.05})
+
+    results, _ = search.fan_out('knowledge graphs', 5)
+    assert results == {}
+
+    # The abandoned call finishes in the background and its result is cached
+    deadline = time.monotonic() + 5
+    while search.cache.get_stats()['queries'] == 0 and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+    started = time.monotonic()
+    results, complete = search.fan_out('knowledge graphs', 5)
+
+    assert time.monotonic() - started < 0.1
+    assert len(results['slow']) == 1
+    assert complete
+    assert calls == ['knowledge graphs']
+
+
+def test_provider_with_every_worker_busy_is_skipped(monkeypatch):
+    monkeypatch.setenv('SCHOLARLY_PROVIDER_WORKERS', '1')
+    release = threading.Event()
+    calls = []
+
+    def hung(query, limit):
+        calls.append(query)
+        release.wait(5)
+        return []
+
+    search = make_search({'hung': hung, 'fast': fake_provider()}, timeouts={'hung': 0.1})
+    try:
+        search.fan_out('first query', 5)
+
+        started = time.monotonic()
+        results, complete = search.fan_out('second query', 5)
+
+        assert time.monotonic() - started < 0.1
+        assert set(results) == {'fast'}
+        assert not complete
+        assert calls == ['first query']
+    finally:
+        release.set()
@@ -0,0 +1,112 @@
+import io
+import os
+import mmap
+import codecs
+import hashlib
+import logging
+import tempfile
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured size limit"""
+
+
+class UploadSpool:
+    """An upload copied block by block into memory, or to a temporary file once it grows large.
+
+    The content is hashed on the way in, and copying stops as soon as the size limit
+    is passed. Use as a context manager so the temporary file is removed afterwards.
+    """
+
+    def __init__(self, stream, max_size: int = None, memory_size: int = None, block_size: int = 1 << 20):
+        self.max_size = int(max_size if max_size is not None
+                            else os.getenv('MAX_CONTENT_LENGTH', '16777216').split('#')[0].strip())
+        self.memory_size = int(memory_size if memory_size is not None
+                               else os.getenv('UPLOAD_SPOOL_MEMORY', 1 << 20))
+        self.file = io.BytesIO()
+        self.path = None
+        self.size = 0
+
+        digest = hashlib.sha256()
+        try:
+            while True:
+                block = stream.read(block_size)
+                if not block:
+                    break
+                self.size += len(block)
+                if self.size > self.max_size:
+                    raise UploadTooLargeError(f"Upload exceeds the {self.max_size} byte limit")
+                digest.update(block)
+                if self.path is None and self.size > self.memory_size:
+                    self.roll_to_disk()
+                self.file.write(block)
+        except Exception:
+            self.close()
+            raise
+
+        self.content_hash = digest.hexdigest()
+        self.file.seek(0)
+
+    def roll_to_disk(self):
+        """Move the buffered content into a named temporary file"""
+        spool = tempfile.NamedTemporaryFile(prefix='upload-', delete=False)
+        spool.write(self.file.getbuffer())
+        self.file = spool
+        self.path = spool.name
+
+    @property
+    def source(self):
+        """The path of the spooled file if on disk, else the in-memory file object"""
+        if self.path is not None:
+            self.file.flush()
+            return self.path
+        self.file.seek(0)
+        return self.file
+
+    def close(self):
+        """Release the buffer and remove the temporary file"""
+        self.file.close()
+        if self.path is not None and os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def iter_decoded(source, encoding: str = 'utf-8', block_size: int = 1 << 20) -> Iterator[str]:
+    """Decode a file (path or file object) to text piece by piece, memory-mapping files on disk"""
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            yield from iter_decoded(f, encoding, block_size)
+        return
+
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    try:
+        size = os.fstat(source.fileno()).st_size
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        size = None
+
+    if size:
+        # Pages of the mapping are backed by the file, so they never count as process heap
+        with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            for start in range(0, size, block_size):
+                yield decoder.decode(view[start:start + block_size])
+    else:
+        while True:
+            block = source.read(block_size)
+            if not block:
+                break
+            yield decoder.decode(block)
+
+    yield decoder.decode(b'', final=True)
+
+
+def read_text(source, encoding: str = 'utf-8') -> str:
+    """Read a whole text file through the incremental decoder"""
+    return ''.join(iter_decoded(source, encoding))
@@ -0,0 +1,270 @@
+import os
+import json
+import logging
+import threading
+from typing import List, Dict, Any, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class TextEmbedder:
+    """Batch sentence embeddings from a local transformers model (mean pooled, normalized)"""
+
+    def __init__(self, model_name: str = None, batch_size: int = None, max_length: int = 256):
+        self.model_name = model_name or os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+        self.batch_size = int(batch_size if batch_size is not None else os.getenv('EMBEDDING_BATCH_SIZE', 32))
+        self.max_length = max_length
+        self.setup_model()
+
+    def setup_model(self):
+        """Load the tokenizer and model"""
+        try:
+            import torch
+            from transformers import AutoTokenizer, AutoModel
+
+            self.torch = torch
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            self.model = AutoModel.from_pretrained(self.model_name)
+            self.model.eval()
+            self.dim = self.model.config.hidden_size
+            logger.info(f"Embedding model {self.model_name} loaded")
+        except Exception as e:
+            logger.warning(f"Embedding model not available, semantic search disabled: {e}")
+            self.model = None
+            self.dim = None
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts in batches into an (n, dim) float32 matrix of unit vectors"""
+        if self.model is None:
+            raise RuntimeError("Embedding model is not loaded")
+
+        batches = []
+        with self.torch.no_grad():
+            for start in range(0, len(texts), self.batch_size):
+                encoded = self.tokenizer(texts[start:start + self.batch_size], padding=True,
+                                         truncation=True, max_length=self.max_length,
+                                         return_tensors='pt')
+                output = self.model(**encoded).last_hidden_state
+                mask = encoded['attention_mask'].unsqueeze(-1).to(output.dtype)
+                pooled = (output * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+                batches.append(pooled.numpy().astype(np.float32))
+
+        if not batches:
+            return np.zeros((0, self.dim), dtype=np.float32)
+
+        vectors = np.vstack(batches)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+
+class VectorIndex:
+    """Append-only float32 vector matrix on disk with exact or IVF top-k search.
+
+    Deleted vectors stay in the matrix; their rows are recorded as tombstones and
+    skipped by search.
+    """
+
+    def __init__(self, path: str = None, dim: int = None, ivf_threshold: int = None,
+                 nprobe: int = None, block_size: int = 262144):
+        self.path = path or os.getenv('VECTOR_INDEX_PATH', 'data/vectors')
+        self.ivf_threshold = int(ivf_threshold if ivf_threshold is not None
+                                 else os.getenv('VECTOR_IVF_THRESHOLD', 100000))
+        self.nprobe = int(nprobe if nprobe is not None else os.getenv('VECTOR_IVF_NPROBE', 8))
+        self.block_size = block_size
+        self.lock = threading.RLock()
+        self.training = None
+        os.makedirs(self.path, exist_ok=True)
+        self.load(dim)
+
+    def file(self, name: str) -> str:
+        """Get the path of an index file"""
+        return os.path.join(self.path, name)
+
+    def load(self, dim: int = None):
+        """Map the vector matrix and ids and load the coarse quantizer from disk"""
+        meta_path = self.file('meta.json')
+        meta = {}
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+
+        self.dim = meta.get('dim', dim)
+        self.ivf_built_at = meta.get('ivf_built_at', 0)
+        ids_path = self.file('ids.i64')
+        self.count = os.path.getsize(ids_path) // 8 if os.path.exists(ids_path) else 0
+        self.map_files()
+
+        self.dead = np.zeros(self.count, dtype=bool)
+        if os.path.exists(self.file('deleted.i64')):
+            self.dead[np.fromfile(self.file('deleted.i64'), dtype=np.int64)] = True
+
+        self.centroids = None
+        self.lists = None
+        if os.path.exists(self.file('centroids.npy')):
+            self.centroids = np.load(self.file('centroids.npy'))
+            self.lists = self.build_lists(np.fromfile(self.file('assignments.i32'), dtype=np.int32))
+
+    def map_files(self):
+        """Memory-map the first count rows of the vector and id files"""
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.vectors = None
+        if self.count:
+            self.ids = np.memmap(self.file('ids.i64'), dtype=np.int64, mode='r', shape=(self.count,))
+            if self.dim:
+                self.vectors = np.memmap(self.file('vectors.f32'), dtype=np.float32,
+                                         mode='r', shape=(self.count, self.dim))
+
+    def build_lists(self, assignments: np.ndarray) -> List[np.ndarray]:
+        """Group row numbers by their assigned centroid"""
+        order = np.argsort(assignments, kind='stable')
+        bounds = np.searchsorted(assignments[order], np.arange(len(self.centroids) + 1))
+        return [order[bounds[i]:bounds[i + 1]].astype(np.int64) for i in range(len(self.centroids))]
+
+    def save_meta(self):
+        """Persist the dimension, size and quantizer state"""
+        with open(self.file('meta.json'), 'w') as f:
+            json.dump({'dim': self.dim, 'count': self.count, 'ivf_built_at': self.ivf_built_at}, f)
+
+    def add(self, ids: List[int], vectors: np.ndarray):
+        """Append vectors (unit length, float32) with their chunk ids"""
+        if len(ids) == 0:
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+        with self.lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+
+            with open(self.file('vectors.f32'), 'ab') as f:
+                vectors.tofile(f)
+            with open(self.file('ids.i64'), 'ab') as f:
+                np.asarray(ids, dtype=np.int64).tofile(f)
+
+            first_row = self.count
+            if self.centroids is not None:
+                assignments = self.assign(vectors)
+                with open(self.file('assignments.i32'), 'ab') as f:
+                    assignments.tofile(f)
+                for centroid in np.unique(assignments):
+                    rows = first_row + np.flatnonzero(assignments == centroid)
+                    self.lists[centroid] = np.concatenate([self.lists[centroid], rows])
+
+            self.count += len(ids)
+            self.dead = np.concatenate([self.dead, np.zeros(len(ids), dtype=bool)])
+            self.save_meta()
+            self.map_files()
+
+            # (Re)train the coarse quantizer once the corpus is large or has grown a lot,
+            # in the background so the request that crossed the threshold does not wait
+            if (self.count >= self.ivf_threshold and self.count >= 4 * self.ivf_built_at
+                    and self.training is None):
+                self.training = threading.Thread(target=self.build_ivf, name='vector-ivf', daemon=True)
+                self.training.start()
+
+    def delete(self, ids: List[int]):
+        """Tombstone the live vectors of the given chunk ids"""
+        if len(ids) == 0:
+            return
+        with self.lock:
+            if not self.count:
+                return
+            # Rows rather than ids are recorded, since SQLite can reuse the id of a deleted chunk
+            rows = np.flatnonzero(np.isin(self.ids, np.asarray(ids, dtype=np.int64)) & ~self.dead)
+            with open(self.file('deleted.i64'), 'ab') as f:
+                rows.astype(np.int64).tofile(f)
+            self.dead[rows] = True
+
+    def assign(self, vectors: np.ndarray, centroids: np.ndarray = None) -> np.ndarray:
+        """Assign vectors to their nearest centroid"""
+        centroids = self.centroids if centroids is None else centroids
+        return np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+
+    def build_ivf(self, sample_size: int = 100000):
+        """Train coarse centroids on a sample and assign every vector to a list.
+
+        Training and assignment run on a snapshot without holding the lock; rows added
+        meanwhile are assigned when the new quantizer is swapped in.
+        """
+        try:
+            from sklearn.cluster import MiniBatchKMeans
+
+            with self.lock:
+                count, vectors = self.count, self.vectors
+            nlist = int(min(max(np.sqrt(count), 16), 4096))
+            rng = np.random.default_rng(0)
+            sample = np.sort(rng.choice(count, size=min(sample_size, count), replace=False))
+
+            kmeans = MiniBatchKMeans(n_clusters=nlist, batch_size=4096, n_init=3, random_state=0)
+            kmeans.fit(vectors[sample])
+            centroids = kmeans.cluster_centers_.astype(np.float32)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+            assignments = np.empty(count, dtype=np.int32)
+            for start in range(0, count, self.block_size):
+                assignments[start:start + self.block_size] = self.assign(vectors[start:start + self.block_size],
+                                                                         centroids)
+
+            with self.lock:
+                if self.count > count:
+                    assignments = np.concatenate([assignments, self.assign(self.vectors[count:], centroids)])
+                np.save(self.file('centroids.npy'), centroids)
+                assignments.tofile(self.file('assignments.i32'))
+                self.centroids = centroids
+                self.lists = self.build_lists(assignments)
+                self.ivf_built_at = self.count
+                self.save_meta()
+            logger.info(f"Built IVF index: {nlist} lists over {len(assignments)} vectors")
+        except Exception as e:
+            logger.error(f"IVF build failed: {str(e)}")
+        finally:
+            self.training = None
+
+    def search(self, query: np.ndarray, k: int = 10) -> List[Tuple[int, float]]:
+        """Find the k most similar vectors to a unit query vector as (id, score) pairs"""
+        with self.lock:
+            if not self.count:
+                return []
+            query = np.asarray(query, dtype=np.float32).reshape(-1)
+
+            if self.centroids is not None:
+                probe = np.argpartition(-(self.centroids @ query), min(self.nprobe, len(self.centroids) - 1))
+                candidates = np.concatenate([self.lists[centroid] for centroid in probe[:self.nprobe]])
+                candidates.sort()
+                candidates = candidates[~self.dead[candidates]]
+                scores = self.vectors[candidates] @ query
+                rows, scores = self.top_k(candidates, scores, k)
+            else:
+                rows = np.zeros(0, dtype=np.int64)
+                scores = np.zeros(0, dtype=np.float32)
+                # Scan in blocks to bound temporary memory on large matrices
+                for start in range(0, self.count, self.block_size):
+                    block_scores = self.vectors[start:start + self.block_size] @ query
+                    block_rows = np.arange(start, start + len(block_scores))
+                    alive = ~self.dead[start:start + len(block_scores)]
+                    block_rows, block_scores = block_rows[alive], block_scores[alive]
+                    block_rows, block_scores = self.top_k(block_rows, block_scores, k)
+                    rows, scores = self.top_k(np.concatenate([rows, block_rows]),
+                                              np.concatenate([scores, block_scores]), k)
+
+            return [(int(self.ids[row]), float(score)) for row, score in zip(rows, scores)]
+
+    def top_k(self, rows: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Select the k highest scores, sorted descending"""
+        if len(scores) > k:
+            keep = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[keep], scores[keep]
+        order = np.argsort(-scores)
+        return rows[order], scores[order]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get index size and quantizer state"""
+        with self.lock:
+            return {
+                'vectors': self.count,
+                'deleted': int(self.dead.sum()),
+                'dim': self.dim,
+                'ivf_lists': len(self.centroids) if self.centroids is not None else 0
+            }